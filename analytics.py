@@ -3,48 +3,338 @@ Traffic Analytics and Historical Data Logging
 Tracks and analyzes traffic patterns over time.
 """
 
+import copy
 import json
+import functools
+import time
 from datetime import datetime
-from collections import defaultdict
+
+import numpy as np
+
+from logic import SIGNALS, GREEN, RED
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Lane order used for the per-lane columns of the log store
+LANES = ('North', 'South', 'East', 'West')
+
+# Signal codes stored in the per-lane signal column (see logic.SIGNALS)
+SIGNAL_CODES = {name: code for code, name in enumerate(SIGNALS)}
+
+# Stored for lanes a snapshot's signal_state leaves out
+ABSENT_LANE = {'vehicles': 0, 'signal': SIGNALS[RED]}
+
+
+def _congestion_levels(total_vehicles):
+    """
+    Congestion level (0-100) for a junction's total vehicle count.
+    
+    Args:
+        total_vehicles (int or np.ndarray): Vehicle count(s)
+        
+    Returns:
+        float or np.ndarray: Congestion level percentage(s)
+    """
+    max_capacity = 100  # Per-junction capacity
+    return np.minimum(100, (total_vehicles / max_capacity) * 100)
+
+
+def _aggregate_lane_stats_numpy(vehicles_matrix, signal_matrix):
+    """
+    Sum vehicles and count green phases per lane.
+    
+    Args:
+        vehicles_matrix (np.ndarray): (N, lanes) vehicle counts
+        signal_matrix (np.ndarray): (N, lanes) int8 signal codes
+        
+    Returns:
+        tuple: (total_vehicles, times_green) arrays of length lanes
+    """
+    totals = vehicles_matrix.sum(axis=0, dtype=np.int64)
+    times_green = np.count_nonzero(signal_matrix == GREEN, axis=0)
+    return totals, times_green
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _aggregate_lane_stats(vehicles_matrix, signal_matrix):
+        """Loop-based equivalent of _aggregate_lane_stats_numpy, JIT-compiled."""
+        n, lanes = vehicles_matrix.shape
+        totals = np.zeros(lanes, dtype=np.int64)
+        times_green = np.zeros(lanes, dtype=np.int64)
+        for i in range(n):
+            for j in range(lanes):
+                totals[j] += vehicles_matrix[i, j]
+                if signal_matrix[i, j] == GREEN:
+                    times_green[j] += 1
+        return totals, times_green
+else:
+    # Column reductions keep the work in NumPy's C loops without numba
+    _aggregate_lane_stats = _aggregate_lane_stats_numpy
+
+
+def _lttb_indices(x, y, n_out):
+    """
+    Pick `n_out` points of a series with Largest-Triangle-Three-Buckets.
+    
+    The first and last points are always kept; every bucket in between
+    contributes the point forming the largest triangle with the previously
+    kept point and the average of the next bucket, so peaks and dips
+    survive the downsampling.
+    
+    Args:
+        x (np.ndarray): Monotonic x values
+        y (np.ndarray): Series values
+        n_out (int): Number of points to keep
+        
+    Returns:
+        np.ndarray: Sorted indices of the kept points
+    """
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+
+def _memoize_until_logged(method):
+    """
+    Cache a getter's result until the log store next changes.
+    
+    Results are keyed on the method name, the store's cache version and
+    the call arguments; log_snapshot and clear_logs bump the version.
+    Callers get a copy, so changing a returned result never alters later ones.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = (method.__name__, self._cache_version, args, tuple(sorted(kwargs.items())))
+        if key not in self._cache:
+            self._cache[key] = method(self, *args, **kwargs)
+        return copy.deepcopy(self._cache[key])
+    return wrapper
+
 
 class TrafficAnalytics:
     """
     Tracks historical traffic data and generates analytics.
     Records vehicle counts, signal states, and system performance.
+    
+    Snapshots are stored column-wise in NumPy arrays (one array per field)
+    so aggregations run as vectorized reductions instead of dict traversal.
     """
     
-    def __init__(self):
-        """Initialize analytics system."""
-        self.traffic_logs = []  # List of timestamped snapshots
-        self.hourly_stats = defaultdict(lambda: defaultdict(list))
+    INITIAL_CAPACITY = 1024
+    MAX_LOGS = 10000  # Default bound; oldest snapshots are overwritten beyond it
+    
+    def __init__(self, num_junctions=4, max_logs=MAX_LOGS):
+        """
+        Initialize analytics system.
+        
+        Args:
+            num_junctions (int): Junctions to pre-size hourly stats for
+                (grown automatically if a higher junction_id is logged)
+            max_logs (int): Snapshots kept before the oldest are overwritten
+        """
+        self.num_junctions = num_junctions
+        self.max_logs = max_logs
         self.peak_hours = []
         self.average_wait_times = {}
         self.system_efficiency_history = []
         self.total_vehicles_processed = 0
-        
+        self._cache_version = 0
+        self._cache = {}
+        self._allocate(min(self.INITIAL_CAPACITY, self.max_logs))
+        self._reset_hourly_stats()
+    
+    def _reset_hourly_stats(self):
+        """Zero the running per-hour, per-junction snapshot and vehicle totals."""
+        self.hourly_counts = np.zeros((24, self.num_junctions), dtype=np.int64)
+        self.hourly_throughput = np.zeros((24, self.num_junctions), dtype=np.int64)
+    
+    def _update_hourly_stats(self, hour, junction_id, throughput):
+        """Add one snapshot to the running hourly totals."""
+        if junction_id >= self.hourly_counts.shape[1]:
+            extra = junction_id + 1 - self.hourly_counts.shape[1]
+            self.hourly_counts = np.pad(self.hourly_counts, ((0, 0), (0, extra)))
+            self.hourly_throughput = np.pad(self.hourly_throughput, ((0, 0), (0, extra)))
+        self.hourly_counts[hour, junction_id] += 1
+        self.hourly_throughput[hour, junction_id] += throughput
+    
+    def _update_hourly_batch(self, hour, junction_ids, throughput):
+        """Add several same-hour snapshots to the running hourly totals."""
+        if junction_ids.max() >= self.hourly_counts.shape[1]:
+            extra = int(junction_ids.max()) + 1 - self.hourly_counts.shape[1]
+            self.hourly_counts = np.pad(self.hourly_counts, ((0, 0), (0, extra)))
+            self.hourly_throughput = np.pad(self.hourly_throughput, ((0, 0), (0, extra)))
+        np.add.at(self.hourly_counts[hour], junction_ids, 1)
+        np.add.at(self.hourly_throughput[hour], junction_ids, throughput)
+    
+    def _invalidate_cache(self):
+        """Drop cached getter results after the log store changes."""
+        self._cache_version += 1
+        self._cache.clear()
+    
+    def _allocate(self, capacity):
+        """Allocate empty column buffers for `capacity` snapshots."""
+        self._capacity = capacity
+        self._size = 0  # Number of valid snapshots
+        self._next = 0  # Buffer row the next snapshot is written to
+        self._ts_ms = np.empty(capacity, dtype=np.int64)  # Epoch milliseconds
+        self._hour = np.empty(capacity, dtype=np.int8)
+        self._junction = np.empty(capacity, dtype=np.int32)
+        self._throughput = np.empty(capacity, dtype=np.int32)
+        self._congestion = np.empty(capacity, dtype=np.float64)
+        self._cycle = np.empty(capacity, dtype=np.int32)
+        self._lane_vehicles = np.empty((capacity, len(LANES)), dtype=np.int32)
+        self._lane_signal = np.empty((capacity, len(LANES)), dtype=np.int8)
+    
+    def _grow(self):
+        """Double the capacity of every column buffer, up to max_logs."""
+        capacity = min(2 * self._capacity, self.max_logs)
+        self._capacity = capacity
+        self._ts_ms = np.resize(self._ts_ms, capacity)
+        self._hour = np.resize(self._hour, capacity)
+        self._junction = np.resize(self._junction, capacity)
+        self._throughput = np.resize(self._throughput, capacity)
+        self._congestion = np.resize(self._congestion, capacity)
+        self._cycle = np.resize(self._cycle, capacity)
+        self._lane_vehicles = np.resize(self._lane_vehicles, (capacity, len(LANES)))
+        self._lane_signal = np.resize(self._lane_signal, (capacity, len(LANES)))
+        self._next = self._size
+    
     def log_snapshot(self, timestamp, junction_id, signal_state, statistics):
         """
         Log a snapshot of traffic state.
         
+        Once max_logs snapshots are stored, each new snapshot replaces the
+        oldest one so memory stays bounded during long simulations.
+        
         Args:
-            timestamp (str): ISO format timestamp
+            timestamp (float): Epoch seconds (datetime or ISO string also accepted)
             junction_id (int): Which junction
-            signal_state (dict): Current signal states for all lanes
+            signal_state (dict): Current signal states by lane; lanes left out
+                are stored as 0 vehicles on RED
             statistics (dict): Traffic statistics
         """
-        snapshot = {
-            'timestamp': timestamp,
-            'datetime': datetime.fromisoformat(timestamp),
-            'junction_id': junction_id,
-            'signal_state': signal_state,
-            'statistics': statistics,
-            'congestion_level': self._calculate_congestion_level(statistics),
-            'throughput': statistics['total_vehicles']
-        }
+        if self._size == self._capacity and self._capacity < self.max_logs:
+            self._grow()
+        
+        epoch, hour = self._parse_timestamp(timestamp)
+        
+        i = self._next
+        self._ts_ms[i] = int(epoch * 1000)
+        self._hour[i] = hour
+        self._junction[i] = junction_id
+        self._throughput[i] = statistics['total_vehicles']
+        self._congestion[i] = self._calculate_congestion_level(statistics)
+        self._cycle[i] = statistics.get('cycle_number', 0)
+        for j, lane in enumerate(LANES):
+            state = signal_state.get(lane, ABSENT_LANE)
+            self._lane_vehicles[i, j] = state['vehicles']
+            self._lane_signal[i, j] = SIGNAL_CODES[state['signal']]
+        
+        self._next = (i + 1) % self._capacity
+        self._size = min(self._size + 1, self._capacity)
         
-        self.traffic_logs.append(snapshot)
-        self._update_hourly_stats(snapshot)
+        self._update_hourly_stats(hour, junction_id, statistics['total_vehicles'])
         self.total_vehicles_processed += statistics['total_vehicles']
+        self._invalidate_cache()
+    
+    def log_batch(self, timestamp, junction_states):
+        """
+        Log one snapshot per junction, all taken at the same time.
+        
+        Equivalent to calling log_snapshot for each junction, but the rows
+        are written with one slice assignment per column.
+        
+        Args:
+            timestamp (float): Epoch seconds (datetime or ISO string also accepted)
+            junction_states (dict): Junction id -> dict with 'signal_state'
+                and 'statistics', as returned by get_all_junctions_state()
+        """
+        if not junction_states:
+            return
+        
+        epoch, hour = self._parse_timestamp(timestamp)
+        junction_ids = np.fromiter(junction_states, dtype=np.int32, count=len(junction_states))
+        states = list(junction_states.values())
+        throughput = np.array([state['statistics']['total_vehicles'] for state in states], dtype=np.int64)
+        cycles = np.array([state['statistics'].get('cycle_number', 0) for state in states], dtype=np.int32)
+        lane_vehicles = np.array(
+            [[state['signal_state'].get(lane, ABSENT_LANE)['vehicles'] for lane in LANES] for state in states],
+            dtype=np.int32
+        )
+        lane_signal = np.array(
+            [[SIGNAL_CODES[state['signal_state'].get(lane, ABSENT_LANE)['signal']] for lane in LANES]
+             for state in states],
+            dtype=np.int8
+        )
+        
+        self._update_hourly_batch(hour, junction_ids, throughput)
+        self.total_vehicles_processed += int(throughput.sum())
+        
+        while self._size + len(states) > self._capacity and self._capacity < self.max_logs:
+            self._grow()
+        
+        # Only the newest `capacity` rows can survive a batch larger than the buffer
+        count = min(len(states), self._capacity)
+        keep = slice(len(states) - count, None)
+        rows = (self._next + np.arange(count)) % self._capacity
+        
+        self._ts_ms[rows] = int(epoch * 1000)
+        self._hour[rows] = hour
+        self._junction[rows] = junction_ids[keep]
+        self._throughput[rows] = throughput[keep]
+        self._congestion[rows] = _congestion_levels(throughput[keep])
+        self._cycle[rows] = cycles[keep]
+        self._lane_vehicles[rows] = lane_vehicles[keep]
+        self._lane_signal[rows] = lane_signal[keep]
+        
+        self._next = int(rows[-1] + 1) % self._capacity
+        self._size = min(self._size + count, self._capacity)
+        self._invalidate_cache()
+    
+    @staticmethod
+    def _parse_timestamp(timestamp):
+        """Return (epoch seconds, local hour of day) for a snapshot timestamp."""
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        if isinstance(timestamp, datetime):
+            return timestamp.timestamp(), timestamp.hour
+        epoch = float(timestamp)
+        # localtime applies the UTC offset in effect at `epoch`, DST included
+        return epoch, time.localtime(epoch).tm_hour
+    
+    def _recent(self, column, count):
+        """Return the last `count` values of a column in logging order."""
+        count = min(count, self._size)
+        if self._size < self._capacity:
+            return column[self._size - count:self._size]
+        rows = np.arange(self._next - count, self._next) % self._capacity
+        return column[rows]
     
     def _calculate_congestion_level(self, statistics):
         """
@@ -56,42 +346,37 @@ class TrafficAnalytics:
         Returns:
             float: Congestion level percentage
         """
-        total = statistics['total_vehicles']
-        max_capacity = 100  # Per-junction capacity
-        return min(100, (total / max_capacity) * 100)
+        return float(_congestion_levels(statistics['total_vehicles']))
     
-    def _update_hourly_stats(self, snapshot):
-        """Update hourly statistics."""
-        hour = snapshot['datetime'].hour
-        junction_id = snapshot['junction_id']
-        
-        self.hourly_stats[hour][junction_id].append(snapshot)
+    def _junction_mask(self, junction_id):
+        """Boolean mask over logged snapshots, or None for all junctions."""
+        if junction_id is None:
+            return None
+        return self._junction[:self._size] == junction_id
     
+    @_memoize_until_logged
     def get_peak_hours(self):
         """
         Identify peak traffic hours.
         
+        Uses the running hourly totals, so every snapshot logged since the
+        last clear counts, including ones overwritten in the log buffer.
+        
         Returns:
             list: Hours with highest average traffic
         """
-        hour_averages = {}
-        
-        for hour, junctions in self.hourly_stats.items():
-            total_vehicles = sum(
-                sum(s['throughput'] for s in snapshots) 
-                for snapshots in junctions.values()
-            )
-            count = sum(len(snapshots) for snapshots in junctions.values())
-            
-            if count > 0:
-                hour_averages[hour] = total_vehicles / count
+        counts = self.hourly_counts.sum(axis=1)
+        totals = self.hourly_throughput.sum(axis=1)
         
-        # Sort by traffic volume
-        sorted_hours = sorted(hour_averages.items(), key=lambda x: x[1], reverse=True)
-        self.peak_hours = [hour for hour, _ in sorted_hours[:3]]
+        # Sort observed hours by average traffic volume
+        observed = np.flatnonzero(counts)
+        averages = totals[observed] / counts[observed]
+        order = np.argsort(-averages, kind='stable')[:3]
+        self.peak_hours = [int(hour) for hour in observed[order]]
         
         return self.peak_hours
     
+    @_memoize_until_logged
     def get_average_wait_time(self, junction_id=None):
         """
         Calculate average wait time for vehicles.
@@ -102,23 +387,18 @@ class TrafficAnalytics:
         Returns:
             float: Average wait time in seconds
         """
-        relevant_logs = self.traffic_logs
+        cycles = self._cycle[:self._size]
+        mask = self._junction_mask(junction_id)
+        if mask is not None:
+            cycles = cycles[mask]
         
-        if junction_id is not None:
-            relevant_logs = [log for log in self.traffic_logs 
-                           if log['junction_id'] == junction_id]
-        
-        if not relevant_logs:
+        if len(cycles) == 0:
             return 0
         
-        # Average of max green times (proxy for wait time)
-        total_wait = sum(
-            log['statistics']['cycle_number'] * 5  # Estimate based on cycles
-            for log in relevant_logs
-        )
-        
-        return total_wait / len(relevant_logs) if relevant_logs else 0
+        # Average of cycle-based estimates (proxy for wait time)
+        return float(cycles.mean()) * 5
     
+    @_memoize_until_logged
     def get_system_efficiency(self):
         """
         Calculate system efficiency metrics.
@@ -126,11 +406,11 @@ class TrafficAnalytics:
         Returns:
             dict: Efficiency metrics
         """
-        if not self.traffic_logs:
+        n = self._size
+        if n == 0:
             return {'efficiency': 0, 'throughput': 0, 'congestion': 0}
         
-        total_congestion = sum(log['congestion_level'] for log in self.traffic_logs)
-        avg_congestion = total_congestion / len(self.traffic_logs)
+        avg_congestion = float(self._congestion[:n].mean())
         
         efficiency = max(0, 100 - avg_congestion)
         throughput = self.total_vehicles_processed
@@ -139,9 +419,10 @@ class TrafficAnalytics:
             'efficiency_score': round(efficiency, 1),
             'total_throughput': throughput,
             'average_congestion': round(avg_congestion, 1),
-            'total_snapshots': len(self.traffic_logs)
+            'total_snapshots': n
         }
     
+    @_memoize_until_logged
     def get_lane_performance(self, junction_id=None):
         """
         Get performance metrics per lane.
@@ -152,38 +433,55 @@ class TrafficAnalytics:
         Returns:
             dict: Lane-specific metrics
         """
-        relevant_logs = self.traffic_logs
+        vehicles = self._lane_vehicles[:self._size]
+        signals = self._lane_signal[:self._size]
+        mask = self._junction_mask(junction_id)
+        if mask is not None:
+            vehicles = vehicles[mask]
+            signals = signals[mask]
         
-        if junction_id is not None:
-            relevant_logs = [log for log in self.traffic_logs 
-                           if log['junction_id'] == junction_id]
-        
-        lane_stats = defaultdict(lambda: {
-            'total_vehicles': 0,
-            'times_green': 0,
-            'average_wait': 0,
-            'throughput': 0
-        })
+        if len(vehicles) == 0:
+            return {}
         
-        for log in relevant_logs:
-            for lane, state in log['signal_state'].items():
-                lane_stats[lane]['total_vehicles'] += state['vehicles']
-                if state['signal'] == 'GREEN':
-                    lane_stats[lane]['times_green'] += 1
-                lane_stats[lane]['throughput'] += state['vehicles']
+        totals, times_green = _aggregate_lane_stats(
+            np.ascontiguousarray(vehicles),
+            np.ascontiguousarray(signals)
+        )
         
-        return dict(lane_stats)
+        return {
+            lane: {
+                'total_vehicles': int(totals[j]),
+                'times_green': int(times_green[j]),
+                'average_wait': 0,
+                'throughput': int(totals[j])
+            }
+            for j, lane in enumerate(LANES)
+        }
     
+    @_memoize_until_logged
     def export_analytics_report(self):
         """
         Generate comprehensive analytics report.
         
+        The report is built once per state of the log store, so
+        'generated_at' is when it was first requested after the last
+        snapshot.
+        
         Returns:
             str: JSON formatted report
         """
+        if self._size:
+            time_range = {
+                'start': datetime.fromtimestamp(self._recent(self._ts_ms, self._size)[0] / 1000).isoformat(),
+                'end': datetime.fromtimestamp(self._recent(self._ts_ms, 1)[0] / 1000).isoformat()
+            }
+        else:
+            time_range = None
+        
         report = {
             'generated_at': datetime.now().isoformat(),
-            'total_logs': len(self.traffic_logs),
+            'time_range': time_range,
+            'total_logs': self._size,
             'total_vehicles_processed': self.total_vehicles_processed,
             'efficiency': self.get_system_efficiency(),
             'peak_hours': self.get_peak_hours(),
@@ -193,6 +491,40 @@ class TrafficAnalytics:
         
         return json.dumps(report, indent=2)
     
+    @_memoize_until_logged
+    def get_congestion_history(self, junction_id=None, max_points=2000):
+        """
+        Get the congestion level over time, downsampled for plotting.
+        
+        Snapshots logged together for several junctions are averaged into
+        one point. Series longer than max_points are reduced with LTTB, so
+        charts stay light however long the simulation has been running.
+        
+        Args:
+            junction_id (int): Specific junction or None for all
+            max_points (int): Maximum number of points returned
+            
+        Returns:
+            tuple: (epoch milliseconds, congestion percentage) arrays
+        """
+        timestamps = self._recent(self._ts_ms, self._size)
+        congestion = self._recent(self._congestion, self._size)
+        if junction_id is not None:
+            mask = self._recent(self._junction, self._size) == junction_id
+            timestamps = timestamps[mask]
+            congestion = congestion[mask]
+        
+        if len(timestamps) == 0:
+            return timestamps, congestion
+        
+        # Timestamps are non-decreasing, so equal ones form consecutive runs
+        starts = np.flatnonzero(np.r_[True, timestamps[1:] != timestamps[:-1]])
+        timestamps = timestamps[starts]
+        congestion = np.add.reduceat(congestion, starts) / np.diff(np.r_[starts, len(congestion)])
+        
+        keep = _lttb_indices(timestamps, congestion, max_points)
+        return timestamps[keep], congestion[keep]
+    
     def get_traffic_trend(self, last_n_logs=10):
         """
         Get traffic trend (increasing, decreasing, stable).
@@ -203,11 +535,11 @@ class TrafficAnalytics:
         Returns:
             dict: Trend information
         """
-        if len(self.traffic_logs) < 2:
+        n = self._size
+        if n < 2:
             return {'trend': 'insufficient_data', 'direction': 'N/A'}
         
-        recent = self.traffic_logs[-last_n_logs:]
-        congestion_values = [log['congestion_level'] for log in recent]
+        congestion_values = self._recent(self._congestion, last_n_logs).tolist()
         
         if congestion_values[-1] > congestion_values[0] * 1.1:
             trend = 'increasing'
@@ -228,9 +560,10 @@ class TrafficAnalytics:
     
     def clear_logs(self):
         """Clear all logged data and reset all counters."""
-        self.traffic_logs = []
-        self.hourly_stats = defaultdict(lambda: defaultdict(list))
         self.peak_hours = []
         self.average_wait_times = {}
         self.system_efficiency_history = []
         self.total_vehicles_processed = 0
+        self._allocate(min(self.INITIAL_CAPACITY, self.max_logs))
+        self._reset_hourly_stats()
+        self._invalidate_cache()
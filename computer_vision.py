@@ -3,26 +3,226 @@ Computer Vision Module for Vehicle Detection
 Integrates OpenCV for real-time vehicle detection via camera feeds
 """
 
+import os
+import queue
+import threading
 import numpy as np
+from collections import deque
 from typing import List, Dict, Tuple, Optional
 
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# YOLOv5n exported to OpenVINO IR (yolov5 export.py --include openvino),
+# then INT8-quantized with quantize_yolo_model()
+YOLO_FP32_MODEL = 'yolov5n_openvino_model/yolov5n.xml'
+YOLO_OPENVINO_MODEL = 'yolov5n_openvino_model/yolov5n_int8.xml'
+# YOLOv5n ONNX built into an FP16 TensorRT engine:
+# trtexec --onnx=yolov5n.onnx --fp16 --saveEngine=yolov5n_fp16.engine
+YOLO_TENSORRT_ENGINE = 'yolov5n_fp16.engine'
+YOLO_INPUT_SIZE = 640
+
+# COCO class ids that count as vehicles
+VEHICLE_CLASSES = {2: 'car', 3: 'motorcycle', 5: 'bus', 7: 'truck'}
+VEHICLE_CLASS_NAMES = tuple(VEHICLE_CLASSES.values())
+# Columns of those classes' scores in a YOLOv5 output row (after box and objectness)
+VEHICLE_SCORE_COLUMNS = 5 + np.array(list(VEHICLE_CLASSES))
+
+# Dark pixel bounds for color detection (see detect_vehicles_color)
+DARK_LOWER = np.array([0, 0, 0], dtype=np.uint8)
+DARK_UPPER = np.array([100, 100, 100], dtype=np.uint8)
+
+
+# Congestion levels, indexed by the code _frame_metrics returns
+CONGESTION_LEVELS = ('low', 'medium', 'high')
+
+
+def _frame_metrics_numpy(widths: np.ndarray, heights: np.ndarray, frame_area: int) -> Tuple[int, int]:
+    """
+    Average box area and congestion code for one frame's detections
+    Returns: (average_vehicle_size, index into CONGESTION_LEVELS)
+    """
+    count = len(widths)
+    if count == 0:
+        return 0, 0
+    
+    average_size = int(np.mean(widths * heights))
+    
+    # Simple congestion estimation
+    vehicle_density = count / frame_area if frame_area > 0 else 0.0
+    if vehicle_density > 0.1:
+        return average_size, 2
+    elif vehicle_density > 0.05:
+        return average_size, 1
+    return average_size, 0
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _frame_metrics(widths, heights, frame_area):
+        """Loop-based equivalent of _frame_metrics_numpy, JIT-compiled"""
+        count = len(widths)
+        if count == 0:
+            return 0, 0
+        
+        total_size = 0
+        for i in range(count):
+            total_size += widths[i] * heights[i]
+        average_size = int(total_size / count)
+        
+        vehicle_density = count / frame_area if frame_area > 0 else 0.0
+        if vehicle_density > 0.1:
+            return average_size, 2
+        elif vehicle_density > 0.05:
+            return average_size, 1
+        return average_size, 0
+else:
+    _frame_metrics = _frame_metrics_numpy
+
+
+def boxes_to_dicts(boxes: np.ndarray, confidence: float = 0.8, label: str = 'vehicle') -> List[Dict]:
+    """
+    Convert an (N, 4) array of [x, y, w, h] boxes to detection dicts
+    All boxes get the same confidence and class (as Haar Cascade reports)
+    """
+    return [
+        {'x': x, 'y': y, 'width': w, 'height': h, 'confidence': confidence, 'class': label}
+        for x, y, w, h in boxes.tolist()
+    ]
+
+
+def _optimize_opencv(cv2):
+    """
+    Make sure OpenCV runs its SIMD (AVX2/NEON) code paths and threaded internals
+    setUseOptimized can be switched off by other libraries; re-enabling is cheap
+    """
+    if not cv2.useOptimized():
+        cv2.setUseOptimized(True)
+    if cv2.getNumThreads() < 1:
+        cv2.setNumThreads(os.cpu_count() or 1)
+
+
+def _put_latest(items: queue.Queue, item):
+    """Put item on a bounded queue, dropping the oldest entry if it is full"""
+    try:
+        items.put_nowait(item)
+    except queue.Full:
+        try:
+            items.get_nowait()
+        except queue.Empty:
+            pass
+        items.put_nowait(item)
+
+
+def _reuse_buffer(buffers: Dict, name, shape: Tuple, dtype=np.uint8) -> np.ndarray:
+    """
+    Per-frame working array, kept in `buffers` and reused across frames
+    Reallocated only when the requested shape or dtype changes
+    """
+    buffer = buffers.get(name)
+    if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+        buffer = buffers[name] = np.empty(shape, dtype)
+    return buffer
+
+
+class _TensorRTModel:
+    """
+    YOLOv5n TensorRT engine with its pinned host and CUDA device buffers
+    Uses the device's primary CUDA context, made current around each call so
+    inference works from any thread (e.g. the CameraIntegration pipeline)
+    """
+    
+    def __init__(self, engine_path: str):
+        import tensorrt as trt
+        import pycuda.driver as cuda
+        
+        cuda.init()
+        self.cuda = cuda
+        self.cuda_context = cuda.Device(0).retain_primary_context()
+        self.cuda_context.push()
+        try:
+            self._load(trt, engine_path)
+        finally:
+            self.cuda_context.pop()
+    
+    def _load(self, trt, engine_path: str):
+        """Deserialize the engine and allocate its buffers (CUDA context current)"""
+        cuda = self.cuda
+        with open(engine_path, 'rb') as f:
+            runtime = trt.Runtime(trt.Logger(trt.Logger.WARNING))
+            self.engine = runtime.deserialize_cuda_engine(f.read())
+        self.context = self.engine.create_execution_context()
+        self.stream = cuda.Stream()
+        
+        # Buffers are allocated once and bound to the context up front
+        self.host = {}
+        self.device = {}
+        self.input_name = self.output_name = None
+        for i in range(self.engine.num_io_tensors):
+            name = self.engine.get_tensor_name(i)
+            shape = tuple(self.engine.get_tensor_shape(name))
+            dtype = trt.nptype(self.engine.get_tensor_dtype(name))
+            self.host[name] = cuda.pagelocked_empty(shape, dtype)
+            self.device[name] = cuda.mem_alloc(self.host[name].nbytes)
+            self.context.set_tensor_address(name, int(self.device[name]))
+            if self.engine.get_tensor_mode(name) == trt.TensorIOMode.INPUT:
+                self.input_name = name
+            elif self.output_name is None:
+                self.output_name = name
+    
+    def infer(self, blob: np.ndarray) -> np.ndarray:
+        """Run one preprocessed 1x3x640x640 blob; returns the raw (1, N, 85) output"""
+        host_in, host_out = self.host[self.input_name], self.host[self.output_name]
+        np.copyto(host_in, blob)
+        self.cuda_context.push()
+        try:
+            self.cuda.memcpy_htod_async(self.device[self.input_name], host_in, self.stream)
+            self.context.execute_async_v3(self.stream.handle)
+            self.cuda.memcpy_dtoh_async(host_out, self.device[self.output_name], self.stream)
+            self.stream.synchronize()
+        finally:
+            self.cuda_context.pop()
+        return host_out
+
 
 class VehicleDetector:
     """Vehicle detection using computer vision"""
     
-    def __init__(self, model_type: str = "cascade"):
+    CONFIDENCE_THRESHOLD = 0.25
+    NMS_THRESHOLD = 0.45
+    INFER_JOBS = 4  # Parallel OpenVINO inference requests for batches
+    CASCADE_MAX_WIDTH = 640  # Wider frames are downscaled before cascade detection
+    
+    def __init__(self, model_type: str = "openvino", model_path: Optional[str] = None,
+                 inference_threads: Optional[int] = None):
         """
         Initialize vehicle detector
-        model_type: 'cascade' (Haar Cascade), 'yolo', 'ssd'
+        model_type: 'openvino' (YOLOv5n on OpenVINO, CPU), 'tensorrt'
+        (YOLOv5n FP16 engine, NVIDIA GPU), 'cascade' (Haar Cascade), 'yolo',
+        'ssd'; 'openvino' and 'tensorrt' fall back to Haar Cascade if unavailable
+        model_path: OpenVINO IR (.xml) or TensorRT engine; defaults to
+        YOLO_OPENVINO_MODEL / YOLO_TENSORRT_ENGINE
+        inference_threads: CPU threads for OpenVINO inference (default: all cores)
         """
         self.model_type = model_type
+        self.inference_threads = inference_threads
+        self.model_path = model_path or {
+            'openvino': YOLO_OPENVINO_MODEL,
+            'tensorrt': YOLO_TENSORRT_ENGINE
+        }.get(model_type)
         self.is_initialized = False
         self.cascade_classifier = None
         self.yolo_model = None
+        self._infer_queue = None
+        self._buffers = {}  # Working arrays reused across frames
         
         try:
             import cv2
             self.cv2 = cv2
+            _optimize_opencv(cv2)
             self._initialize_model()
         except ImportError:
             print("OpenCV not installed. CV features will be unavailable.")
@@ -30,12 +230,32 @@ class VehicleDetector:
     
     def _initialize_model(self):
         """Initialize the detection model"""
+        if self.model_type in ("openvino", "tensorrt") and self.cv2:
+            try:
+                if self.model_type == "tensorrt":
+                    self.yolo_model = _TensorRTModel(self.model_path)
+                else:
+                    import openvino as ov
+                    config = {}
+                    if self.inference_threads:
+                        config["INFERENCE_NUM_THREADS"] = self.inference_threads
+                    self.yolo_model = ov.Core().compile_model(self.model_path, "CPU", config)
+                self.is_initialized = True
+            except Exception:
+                print(f"{self.model_type} model {self.model_path} unavailable, using Haar Cascade")
+                self.model_type = "cascade"
+        
         if self.model_type == "cascade" and self.cv2:
             try:
-                # Try to load Haar Cascade classifier
+                # Try to load Haar Cascade classifier; an unreadable file gives
+                # an empty classifier, caught here rather than on every frame
                 cascade_path = self.cv2.data.haarcascades + 'haarcascade_car.xml'
-                self.cascade_classifier = self.cv2.CascadeClassifier(cascade_path)
-                self.is_initialized = True
+                classifier = self.cv2.CascadeClassifier(cascade_path)
+                if classifier.empty():
+                    print("Failed to load Haar Cascade classifier")
+                else:
+                    self.cascade_classifier = classifier
+                    self.is_initialized = True
             except:
                 print("Failed to load Haar Cascade classifier")
         
@@ -48,39 +268,100 @@ class VehicleDetector:
             except:
                 pass
     
-    def detect_vehicles_cascade(self, frame: np.ndarray) -> List[Dict]:
+    def detect_vehicles(self, frame: np.ndarray, roi: Tuple = None) -> List[Dict]:
+        """
+        Detect vehicles with the loaded model
+        Uses YOLOv5n on OpenVINO when available, Haar Cascade otherwise
+        roi: optional (x1, y1, x2, y2) the Haar Cascade scan is limited to
+        """
+        if self.yolo_model is not None:
+            return self.detect_vehicles_yolo(frame)
+        return self.detect_vehicles_cascade(frame, roi)
+    
+    def detect_vehicles_batch(self, frames: List[np.ndarray]) -> List[List[Dict]]:
+        """
+        Detect vehicles in several frames, returning one list per frame
+        With OpenVINO the frames are pipelined through parallel inference
+        requests instead of waiting on each frame in turn
+        """
+        if self.yolo_model is None:
+            return [self.detect_vehicles_cascade(frame) for frame in frames]
+        if self.model_type == "tensorrt":
+            return [self.detect_vehicles_yolo(frame) for frame in frames]
+        
+        if self._infer_queue is None:
+            import openvino as ov
+            self._infer_queue = ov.AsyncInferQueue(self.yolo_model, self.INFER_JOBS)
+        
+        results = [[] for _ in frames]
+        
+        def on_done(request, index):
+            output = request.get_output_tensor(0).data
+            results[index] = self._parse_yolo_output(output[0], frames[index].shape)
+        
+        self._infer_queue.set_callback(on_done)
+        for index, frame in enumerate(frames):
+            self._infer_queue.start_async({0: self._yolo_blob(frame)}, userdata=index)
+        self._infer_queue.wait_all()
+        return results
+    
+    def detect_vehicles_cascade(self, frame: np.ndarray, roi: Tuple = None) -> List[Dict]:
         """
         Detect vehicles using Haar Cascade
+        roi: optional (x1, y1, x2, y2); only that part of the frame is scanned
         Returns: list of detected vehicles with bounding boxes
         """
+        return boxes_to_dicts(self.detect_boxes_cascade(frame, roi))
+    
+    def detect_boxes_cascade(self, frame: np.ndarray, roi: Tuple = None) -> np.ndarray:
+        """
+        Detect vehicles using Haar Cascade
+        roi: optional (x1, y1, x2, y2); only that part of the frame is scanned
+        Returns: (N, 4) int32 array of [x, y, w, h] boxes in frame coordinates
+        """
         if not self.cv2 or not self.cascade_classifier:
-            return []
+            return np.empty((0, 4), dtype=np.int32)
         
-        try:
-            gray = self.cv2.cvtColor(frame, self.cv2.COLOR_BGR2GRAY)
-            
-            # Detect vehicles
-            vehicles = self.cascade_classifier.detectMultiScale(
-                gray,
-                scaleFactor=1.1,
-                minNeighbors=5,
-                minSize=(30, 30)
+        # Crop to the region of interest (a view, no copy); boxes are
+        # shifted back by its origin below
+        x1 = y1 = 0
+        if roi:
+            x1, y1 = max(0, int(roi[0])), max(0, int(roi[1]))
+            frame = frame[y1:max(y1, int(roi[3])), x1:max(x1, int(roi[2]))]
+            if frame.size == 0:
+                return np.empty((0, 4), dtype=np.int32)
+        
+        # Cap the width the detection pyramid starts from; boxes are
+        # scaled back to frame coordinates below
+        scale = min(1.0, self.CASCADE_MAX_WIDTH / frame.shape[1])
+        if scale < 1.0:
+            size = (self.CASCADE_MAX_WIDTH, int(frame.shape[0] * scale))
+            frame = self.cv2.resize(
+                frame,
+                size,
+                dst=_reuse_buffer(self._buffers, 'cascade_small', size[::-1] + frame.shape[2:]),
+                interpolation=self.cv2.INTER_AREA
             )
-            
-            detections = []
-            for (x, y, w, h) in vehicles:
-                detections.append({
-                    'x': int(x),
-                    'y': int(y),
-                    'width': int(w),
-                    'height': int(h),
-                    'confidence': 0.8,
-                    'class': 'vehicle'
-                })
-            
-            return detections
-        except:
-            return []
+        gray = self.cv2.cvtColor(
+            frame,
+            self.cv2.COLOR_BGR2GRAY,
+            dst=_reuse_buffer(self._buffers, 'cascade_gray', frame.shape[:2])
+        )
+        
+        # Detect vehicles
+        min_size = max(1, int(30 * scale))
+        vehicles = self.cascade_classifier.detectMultiScale(
+            gray,
+            scaleFactor=1.2,
+            minNeighbors=5,
+            minSize=(min_size, min_size)
+        )
+        
+        # detectMultiScale returns an empty tuple when nothing is found
+        boxes = (np.asarray(vehicles).reshape(-1, 4) / scale).astype(np.int32)
+        boxes[:, 0] += x1
+        boxes[:, 1] += y1
+        return boxes
     
     def detect_vehicles_color(self, frame: np.ndarray, lane_region: Tuple = None) -> int:
         """
@@ -92,69 +373,137 @@ class VehicleDetector:
         if frame is None or self.cv2 is None:
             return 0
         
-        try:
-            # Extract lane region if specified
-            if lane_region:
-                x1, y1, x2, y2 = lane_region
-                roi = frame[y1:y2, x1:x2]
-            else:
-                roi = frame
-            
-            # Convert to HSV for better color detection
-            hsv = self.cv2.cvtColor(roi, self.cv2.COLOR_BGR2HSV)
-            
-            # Detect dark colors (vehicle colors typically darker)
-            lower = np.array([0, 0, 0])
-            upper = np.array([180, 255, 100])
-            
-            mask = self.cv2.inRange(hsv, lower, upper)
-            
-            # Find contours
-            contours, _ = self.cv2.findContours(mask, self.cv2.RETR_TREE, self.cv2.CHAIN_APPROX_SIMPLE)
-            
-            # Filter contours by size (vehicles have minimum size)
-            vehicle_count = 0
-            for contour in contours:
-                area = self.cv2.contourArea(contour)
-                if 200 < area < 10000:  # Adjust these values based on camera setup
-                    vehicle_count += 1
-            
-            return vehicle_count
-        except:
+        # Extract lane region if specified
+        if lane_region:
+            x1, y1, x2, y2 = lane_region
+            roi = frame[y1:y2, x1:x2]
+        else:
+            roi = frame
+        
+        # A reversed or out-of-frame region is empty; resize rejects empty input
+        if roi.size == 0:
             return 0
+        
+        # Work at half resolution; blob areas shrink by scale**2.
+        # Buffers are kept per lane region, as each has its own size
+        scale = 0.5
+        size = (max(1, round(roi.shape[1] * scale)), max(1, round(roi.shape[0] * scale)))
+        roi = self.cv2.resize(
+            roi,
+            size,
+            dst=_reuse_buffer(self._buffers, ('color_roi', lane_region), size[::-1] + roi.shape[2:]),
+            interpolation=self.cv2.INTER_AREA
+        )
+        
+        # Detect dark colors (vehicle colors typically darker). HSV value
+        # is the largest BGR channel, so "value <= 100" is the same as
+        # every channel <= 100 and needs no HSV conversion
+        mask = self.cv2.inRange(
+            roi, DARK_LOWER, DARK_UPPER,
+            dst=_reuse_buffer(self._buffers, ('color_mask', lane_region), size[::-1])
+        )
+        
+        # Blob areas in one call; label 0 is the background
+        _, _, stats, _ = self.cv2.connectedComponentsWithStats(mask, connectivity=8)
+        areas = stats[1:, self.cv2.CC_STAT_AREA] / (scale * scale)
+        
+        # Filter blobs by size (vehicles have minimum size)
+        # Adjust these values based on camera setup
+        return int(np.count_nonzero((areas > 200) & (areas < 10000)))
     
     def detect_vehicles_yolo(self, frame: np.ndarray) -> List[Dict]:
         """
-        Detect vehicles using YOLOv5
-        Requires pytorch and yolov5 installation
+        Detect vehicles using YOLOv5n compiled with OpenVINO or TensorRT
+        Requires the matching runtime and exported model (see YOLO_OPENVINO_MODEL)
         """
-        if not self.yolo_model:
+        if not self.cv2 or self.yolo_model is None:
             return []
         
-        try:
-            # This would use YOLOv5 inference
-            # results = self.yolo_model(frame)
-            # Parse and return detections
-            return []
-        except:
+        blob = self._yolo_blob(frame)
+        if self.model_type == "tensorrt":
+            output = self.yolo_model.infer(blob)
+        else:
+            output = self.yolo_model([blob])[self.yolo_model.output(0)]
+        return self._parse_yolo_output(output[0], frame.shape)
+    
+    def _yolo_blob(self, frame: np.ndarray) -> np.ndarray:
+        """Resize, scale to 0-1 and convert a BGR frame to a 1x3x640x640 RGB input"""
+        return self.cv2.dnn.blobFromImage(
+            frame, 1 / 255.0, (YOLO_INPUT_SIZE, YOLO_INPUT_SIZE), swapRB=True, crop=False
+        )
+    
+    def _parse_yolo_output(self, predictions: np.ndarray, frame_shape: Tuple) -> List[Dict]:
+        """
+        Turn one frame's raw YOLOv5 output into vehicle detections
+        predictions: (N, 85) rows of cx, cy, w, h, objectness, 80 class scores
+        in network input pixels; boxes are scaled back to frame_shape
+        """
+        # Vehicle class scores only, weighted by objectness
+        scores = predictions[:, 4:5] * predictions[:, VEHICLE_SCORE_COLUMNS]
+        best = scores.argmax(axis=1)
+        confidence = scores[np.arange(len(scores)), best]
+        
+        keep = confidence > self.CONFIDENCE_THRESHOLD
+        if not keep.any():
             return []
+        predictions, best, confidence = predictions[keep], best[keep], confidence[keep]
+        
+        height, width = frame_shape[:2]
+        scale = np.array([width, height, width, height]) / YOLO_INPUT_SIZE
+        cx, cy, w, h = (predictions[:, :4] * scale).T
+        boxes = np.stack([cx - w / 2, cy - h / 2, w, h], axis=1)
+        
+        indices = self.cv2.dnn.NMSBoxes(
+            boxes.tolist(), confidence.tolist(), self.CONFIDENCE_THRESHOLD, self.NMS_THRESHOLD
+        )
+        return [
+            {
+                'x': int(boxes[i, 0]),
+                'y': int(boxes[i, 1]),
+                'width': int(boxes[i, 2]),
+                'height': int(boxes[i, 3]),
+                'confidence': round(float(confidence[i]), 2),
+                'class': VEHICLE_CLASS_NAMES[best[i]]
+            }
+            for i in np.asarray(indices, dtype=int).reshape(-1)
+        ]
 
 
 class LaneTracker:
     """Track vehicles across lanes using background subtraction"""
     
+    SCALE = 0.5  # Background model runs at half resolution (a quarter of the pixels)
+    LEARNING_RATE = 0.005
+    
     def __init__(self):
         self.lane_counts = {'North': 0, 'East': 0, 'South': 0, 'West': 0}
         self.bg_subtractor = None
         self.cv2 = None
+        self._mask = None  # Foreground mask buffer, reused across frames
+        self._buffers = {}  # Other working arrays reused across frames
         
         try:
             import cv2
             self.cv2 = cv2
-            self.bg_subtractor = cv2.createBackgroundSubtractorMOG2()
+            _optimize_opencv(cv2)
+            self.bg_subtractor = cv2.createBackgroundSubtractorKNN(
+                history=200, dist2Threshold=400.0, detectShadows=False
+            )
         except:
             pass
     
+    def _apply(self, frame: np.ndarray) -> np.ndarray:
+        """Update the background model with a downscaled frame; returns its foreground mask"""
+        size = (round(frame.shape[1] * self.SCALE), round(frame.shape[0] * self.SCALE))
+        small = self.cv2.resize(
+            frame,
+            size,
+            dst=_reuse_buffer(self._buffers, 'small', size[::-1] + frame.shape[2:]),
+            interpolation=self.cv2.INTER_AREA
+        )
+        self._mask = self.bg_subtractor.apply(small, self._mask, self.LEARNING_RATE)
+        return self._mask
+    
     def count_vehicles_in_lanes(self, frame: np.ndarray, lane_regions: Dict) -> Dict:
         """
         Count vehicles in multiple lanes
@@ -163,47 +512,61 @@ class LaneTracker:
         if not self.cv2 or not self.bg_subtractor:
             return {lane: 0 for lane in lane_regions.keys()}
         
-        try:
-            # Apply background subtraction
-            mask = self.bg_subtractor.apply(frame)
-            
-            # For each lane, count vehicles
-            counts = {}
-            for lane_name, (x1, y1, x2, y2) in lane_regions.items():
-                lane_mask = mask[y1:y2, x1:x2]
-                
-                # Count white pixels as potential vehicles
-                vehicle_pixels = self.cv2.countNonZero(lane_mask)
-                
-                # Convert pixel count to vehicle count (adjust threshold as needed)
-                vehicle_count = max(0, vehicle_pixels // 500)
-                counts[lane_name] = vehicle_count
-            
-            return counts
-        except:
-            return {lane: 0 for lane in lane_regions.keys()}
+        # Apply background subtraction
+        mask = self._apply(frame)
+        
+        # Summed-area table of foreground pixels: one pass over the mask,
+        # after which any lane rectangle (overlapping ones included)
+        # is four lookups
+        foreground = np.greater(mask, 0, out=_reuse_buffer(self._buffers, 'foreground', mask.shape, bool))
+        integral = self.cv2.integral(
+            foreground.view(np.uint8),
+            sum=_reuse_buffer(self._buffers, 'integral', (mask.shape[0] + 1, mask.shape[1] + 1), np.int32),
+            sdepth=self.cv2.CV_32S
+        )
+        
+        height, width = mask.shape[:2]
+        # Lane regions are in full-resolution pixels; map them onto the mask
+        regions = np.rint(np.array(list(lane_regions.values())).reshape(-1, 4) * self.SCALE).astype(int)
+        x1, x2 = np.clip(regions[:, [0, 2]], 0, width).T
+        y1, y2 = np.clip(regions[:, [1, 3]], 0, height).T
+        # A reversed pair is an empty range, as with mask[y1:y2, x1:x2]
+        x2 = np.maximum(x1, x2)
+        y2 = np.maximum(y1, y2)
+        
+        # Count white pixels as potential vehicles, for every lane at once
+        vehicle_pixels = integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+        
+        # Convert pixel count (back in full-resolution pixels) to vehicle
+        # count (adjust threshold as needed)
+        vehicle_counts = np.maximum(0, vehicle_pixels / (self.SCALE * self.SCALE) // 500)
+        return {lane: int(count) for lane, count in zip(lane_regions, vehicle_counts)}
     
     def update(self, frame: np.ndarray):
         """Update background model with new frame"""
         if self.bg_subtractor:
-            try:
-                self.bg_subtractor.apply(frame)
-            except:
-                pass
+            self._apply(frame)
 
 
 class TrafficFlowAnalyzer:
     """Analyze traffic flow patterns from video"""
     
+    HISTORY_SIZE = 4096  # Frames of metrics kept; older ones are dropped
+    
     def __init__(self):
         self.frame_count = 0
-        self.vehicle_history = []
+        self.vehicle_history = deque(maxlen=self.HISTORY_SIZE)
         self.flow_metrics = {}
+        # Ring buffer of running vehicle totals: the total after frame n is at
+        # n % (HISTORY_SIZE + 1), so any window up to HISTORY_SIZE frames is
+        # the difference of two entries
+        self._totals = np.zeros(self.HISTORY_SIZE + 1, dtype=np.int64)
     
-    def analyze_frame(self, frame: np.ndarray, detections: List[Dict]) -> Dict:
+    def analyze_frame(self, frame: np.ndarray, detections) -> Dict:
         """
         Analyze traffic flow in current frame
-        detections: list of vehicle detections
+        detections: list of vehicle detections, or an (N, 4) array of
+        [x, y, w, h] boxes (see detect_boxes_cascade)
         """
         self.frame_count += 1
         
@@ -214,47 +577,70 @@ class TrafficFlowAnalyzer:
             'congestion_level': 'low'
         }
         
-        if detections:
-            sizes = [d['width'] * d['height'] for d in detections]
-            metrics['average_vehicle_size'] = int(np.mean(sizes))
-            
-            # Simple congestion estimation
-            vehicle_density = len(detections) / (frame.shape[0] * frame.shape[1]) if frame is not None else 0
-            if vehicle_density > 0.1:
-                metrics['congestion_level'] = 'high'
-            elif vehicle_density > 0.05:
-                metrics['congestion_level'] = 'medium'
+        if len(detections):
+            if isinstance(detections, np.ndarray):
+                widths = detections[:, 2].astype(np.int64)
+                heights = detections[:, 3].astype(np.int64)
             else:
-                metrics['congestion_level'] = 'low'
+                count = len(detections)
+                widths = np.fromiter((d['width'] for d in detections), dtype=np.int64, count=count)
+                heights = np.fromiter((d['height'] for d in detections), dtype=np.int64, count=count)
+            frame_area = frame.shape[0] * frame.shape[1] if frame is not None else 0
+            
+            average_size, congestion = _frame_metrics(widths, heights, frame_area)
+            metrics['average_vehicle_size'] = average_size
+            metrics['congestion_level'] = CONGESTION_LEVELS[congestion]
         
+        slots = len(self._totals)
+        self._totals[self.frame_count % slots] = self._totals[(self.frame_count - 1) % slots] + len(detections)
         self.vehicle_history.append(metrics)
         return metrics
     
     def get_average_flow(self, window_size: int = 30):
         """Get average traffic flow over window"""
-        if len(self.vehicle_history) < window_size:
-            window = self.vehicle_history
-        else:
-            window = self.vehicle_history[-window_size:]
-        
-        if not window:
+        window = min(window_size, self.frame_count, self.HISTORY_SIZE)
+        if window <= 0:
             return 0
         
-        avg_vehicles = np.mean([m['total_vehicles'] for m in window])
-        return int(avg_vehicles)
+        slots = len(self._totals)
+        total = self._totals[self.frame_count % slots] - self._totals[(self.frame_count - window) % slots]
+        return int(total / window)
 
 
 class CameraIntegration:
     """Main camera integration interface"""
     
-    def __init__(self, camera_id: int = 0):
+    QUEUE_SIZE = 2  # Frames/results buffered between pipeline stages; oldest dropped
+    # Motion gate: detection is skipped while a 64x64 grayscale thumbnail
+    # differs from the last detected frame's by less than MOTION_THRESHOLD
+    # per pixel on average, but re-run at least every MAX_SKIPPED_FRAMES
+    MOTION_GATE_SIZE = (64, 64)
+    MOTION_THRESHOLD = 2.0
+    MAX_SKIPPED_FRAMES = 10
+    # Capture format requested from local cameras
+    FRAME_WIDTH = 1280
+    FRAME_HEIGHT = 720
+    
+    def __init__(self, camera_id: int = 0, model_type: str = "openvino"):
+        """
+        camera_id: local camera index, or a stream URL (e.g. rtsp://...)
+        model_type: VehicleDetector backend, e.g. 'tensorrt' on NVIDIA GPUs
+        """
         self.camera_id = camera_id
         self.cap = None
-        self.detector = VehicleDetector()
+        self.detector = VehicleDetector(model_type)
         self.tracker = LaneTracker()
         self.analyzer = TrafficFlowAnalyzer()
         self.is_active = False
         self.cv2 = None
+        self._stop = threading.Event()
+        self._threads = []
+        self._results = None
+        self._buffers = {}
+        self._reference_thumbnail = None  # Thumbnail of the last detected frame
+        self._last_detections = []
+        self._skipped_frames = 0
+        self._lane_bounds_cache = None  # (lane regions, their bounding box)
         
         try:
             import cv2
@@ -269,7 +655,21 @@ class CameraIntegration:
             return False
         
         try:
-            self.cap = self.cv2.VideoCapture(self.camera_id)
+            if isinstance(self.camera_id, str):
+                # Network stream: FFmpeg backend, RTSP over TCP to avoid
+                # dropped UDP packets
+                os.environ.setdefault('OPENCV_FFMPEG_CAPTURE_OPTIONS', 'rtsp_transport;tcp')
+                self.cap = self.cv2.VideoCapture(self.camera_id, self.cv2.CAP_FFMPEG)
+            else:
+                self.cap = self.cv2.VideoCapture(self.camera_id)
+                # Ask for MJPEG instead of raw YUYV (less USB bandwidth and no
+                # YUYV->BGR conversion) at a fixed size; unsupported settings
+                # are ignored by the driver
+                self.cap.set(self.cv2.CAP_PROP_FOURCC, self.cv2.VideoWriter_fourcc(*'MJPG'))
+                self.cap.set(self.cv2.CAP_PROP_FRAME_WIDTH, self.FRAME_WIDTH)
+                self.cap.set(self.cv2.CAP_PROP_FRAME_HEIGHT, self.FRAME_HEIGHT)
+            # Keep only the newest frame queued, so reads are never stale
+            self.cap.set(self.cv2.CAP_PROP_BUFFERSIZE, 1)
             
             if not self.cap.isOpened():
                 print(f"Failed to open camera {self.camera_id}")
@@ -286,15 +686,37 @@ class CameraIntegration:
         if not self.is_active or not self.cap:
             return None
         
-        try:
-            ret, frame = self.cap.read()
-            if ret:
-                return frame
-            else:
-                return None
-        except:
+        ret, frame = self.cap.read()
+        if ret:
+            return frame
+        else:
             return None
     
+    def _scene_changed(self, frame: np.ndarray) -> bool:
+        """
+        Cheap check whether frame differs enough from the last detected one
+        to be worth running the detector on
+        """
+        if self.cv2 is None:
+            return True
+        
+        small = self.cv2.resize(
+            frame,
+            self.MOTION_GATE_SIZE,
+            dst=_reuse_buffer(self._buffers, 'gate_small', self.MOTION_GATE_SIZE[::-1] + frame.shape[2:]),
+            interpolation=self.cv2.INTER_AREA
+        )
+        thumbnail = self.cv2.cvtColor(small, self.cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small.copy()
+        
+        if (self._reference_thumbnail is not None
+                and self._skipped_frames < self.MAX_SKIPPED_FRAMES
+                and self.cv2.norm(thumbnail, self._reference_thumbnail, self.cv2.NORM_L1)
+                < self.MOTION_THRESHOLD * thumbnail.size):
+            return False
+        
+        self._reference_thumbnail = thumbnail
+        return True
+    
     def process_frame(self, frame: np.ndarray, lane_regions: Dict = None) -> Dict:
         """
         Process frame and detect vehicles
@@ -303,16 +725,28 @@ class CameraIntegration:
         if frame is None:
             return {}
         
-        # Detect vehicles
-        detections = self.detector.detect_vehicles_cascade(frame)
-        
-        # Analyze flow
-        flow_metrics = self.analyzer.analyze_frame(frame, detections)
-        
-        # Count vehicles per lane
-        lane_counts = {}
-        if lane_regions:
-            lane_counts = self.tracker.count_vehicles_in_lanes(frame, lane_regions)
+        # The per-frame detector and tracker calls don't catch errors
+        # themselves; a bad frame is reported and skipped here
+        try:
+            # Detect vehicles, reusing the last detections for a static scene
+            if self._scene_changed(frame):
+                detections = self.detector.detect_vehicles(frame, self._lane_bounds(lane_regions))
+                self._last_detections = detections
+                self._skipped_frames = 0
+            else:
+                detections = self._last_detections
+                self._skipped_frames += 1
+            
+            # Analyze flow
+            flow_metrics = self.analyzer.analyze_frame(frame, detections)
+            
+            # Count vehicles per lane
+            lane_counts = {}
+            if lane_regions:
+                lane_counts = self.tracker.count_vehicles_in_lanes(frame, lane_regions)
+        except Exception as e:
+            print(f"Frame processing failed: {e}")
+            return {}
         
         return {
             'detections': detections,
@@ -320,8 +754,81 @@ class CameraIntegration:
             'lane_counts': lane_counts
         }
     
+    def _lane_bounds(self, lane_regions: Dict = None) -> Optional[Tuple]:
+        """
+        Bounding box (x1, y1, x2, y2) of all lane regions, or None without lanes
+        Cached until the lane regions change
+        """
+        if not lane_regions:
+            return None
+        key = tuple(lane_regions.values())
+        if self._lane_bounds_cache is None or self._lane_bounds_cache[0] != key:
+            regions = np.array(key).reshape(-1, 4)
+            bounds = (*regions[:, :2].min(axis=0).tolist(), *regions[:, 2:].max(axis=0).tolist())
+            self._lane_bounds_cache = (key, bounds)
+        return self._lane_bounds_cache[1]
+    
+    def start_pipeline(self, lane_regions: Dict = None) -> bool:
+        """
+        Capture and process frames on background threads
+        One thread reads the camera while another runs detection; OpenCV and
+        the inference runtimes release the GIL, so the two overlap. Queues
+        hold only the newest frames, so results never lag behind the feed.
+        Read results with get_latest_result(); stop with stop_pipeline()
+        """
+        if not self.is_active or self._threads:
+            return False
+        
+        # Leave cores for the capture thread instead of oversubscribing
+        self.cv2.setNumThreads(max(1, (os.cpu_count() or 2) // 2))
+        
+        frames = queue.Queue(maxsize=self.QUEUE_SIZE)
+        self._results = queue.Queue(maxsize=self.QUEUE_SIZE)
+        self._stop.clear()
+        
+        def capture_loop():
+            while not self._stop.is_set():
+                frame = self.capture_frame()
+                if frame is None:
+                    break
+                _put_latest(frames, frame)
+            self._stop.set()
+        
+        def process_loop():
+            while not self._stop.is_set() or not frames.empty():
+                try:
+                    frame = frames.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                _put_latest(self._results, self.process_frame(frame, lane_regions))
+        
+        self._threads = [
+            threading.Thread(target=capture_loop, daemon=True),
+            threading.Thread(target=process_loop, daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+        return True
+    
+    def get_latest_result(self, timeout: float = 1.0) -> Optional[Dict]:
+        """Newest process_frame result from the pipeline, or None on timeout"""
+        if self._results is None:
+            return None
+        try:
+            return self._results.get(timeout=timeout)
+        except queue.Empty:
+            return None
+    
+    def stop_pipeline(self):
+        """Stop the capture/processing threads started by start_pipeline"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+    
     def release_camera(self):
         """Release camera resources"""
+        self.stop_pipeline()
         if self.cap:
             self.cap.release()
             self.is_active = False
@@ -331,9 +838,78 @@ class CameraIntegration:
         self.release_camera()
 
 
+def _analyze_frames(cap, detector: 'VehicleDetector', max_frames: Optional[int] = None,
+                    batch_size: int = 16) -> Tuple[int, int, int, Optional[int]]:
+    """
+    Detect vehicles on frames read from cap, in batches
+    Stops at the end of the video, after max_frames frames or at the first
+    error, keeping the totals of the frames analyzed so far
+    Returns: (frame_count, total_vehicles, peak_vehicles, peak_frame), peak_frame
+    counted from the first frame read
+    """
+    # Running aggregates only, so memory stays flat however long the video is
+    frame_count = 0
+    total_vehicles = 0
+    peak_vehicles = 0
+    peak_frame = None
+    
+    end_of_video = False
+    try:
+        while not end_of_video:
+            # Decode a batch of frames, then detect on all of them at once
+            frames = []
+            while len(frames) < batch_size:
+                if max_frames is not None and frame_count + len(frames) >= max_frames:
+                    end_of_video = True
+                    break
+                ret, frame = cap.read()
+                if not ret:
+                    end_of_video = True
+                    break
+                frames.append(frame)
+            
+            for detections in detector.detect_vehicles_batch(frames):
+                total_vehicles += len(detections)
+                
+                if peak_frame is None or len(detections) > peak_vehicles:
+                    peak_vehicles = len(detections)
+                    peak_frame = frame_count
+                
+                frame_count += 1
+    except Exception:
+        pass
+    
+    return frame_count, total_vehicles, peak_vehicles, peak_frame
+
+
+def _analyze_video_chunk(video_path: str, start: int, count: int, model_type: str,
+                         batch_size: int, threads: int) -> Tuple[int, int, int, Optional[int]]:
+    """
+    Worker process for VideoAnalyzer: analyze `count` frames from frame `start`
+    Opens its own capture and detector, limited to `threads` inference threads
+    (OpenCV runs single-threaded) so the workers don't oversubscribe the CPU;
+    peak_frame is returned as an absolute index
+    """
+    import cv2
+    
+    cv2.setNumThreads(1)
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if start > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        detector = VehicleDetector(model_type, inference_threads=threads)
+        frames, vehicles, peak, peak_frame = _analyze_frames(cap, detector, count, batch_size)
+    finally:
+        cap.release()
+    return frames, vehicles, peak, None if peak_frame is None else start + peak_frame
+
+
 class VideoAnalyzer:
     """Analyze traffic from video files"""
     
+    BATCH_SIZE = 16  # Frames decoded before each detection batch
+    MIN_CHUNK_FRAMES = 256  # Shorter videos are not worth splitting across processes
+    
     def __init__(self, video_path: str):
         self.video_path = video_path
         self.cap = None
@@ -357,45 +933,100 @@ class VideoAnalyzer:
         except:
             return False
     
-    def analyze_video(self) -> Dict:
-        """Analyze entire video and return statistics"""
+    def analyze_video(self, workers: Optional[int] = None) -> Dict:
+        """
+        Analyze entire video and return statistics
+        workers: processes to split the video across (default: one per core);
+        frames are independent, so each process takes a contiguous time range
+        """
         if not self.cap:
             return {}
         
-        frame_count = 0
-        total_vehicles_detected = 0
-        frame_results = []
+        total_frames = int(self.cap.get(self.cv2.CAP_PROP_FRAME_COUNT))
+        workers = min(workers or os.cpu_count() or 1, total_frames // self.MIN_CHUNK_FRAMES)
         
-        try:
-            while True:
-                ret, frame = self.cap.read()
-                if not ret:
-                    break
-                
-                # Detect vehicles
-                detections = self.detector.detect_vehicles_cascade(frame)
-                total_vehicles_detected += len(detections)
-                
-                frame_results.append({
-                    'frame': frame_count,
-                    'vehicles_detected': len(detections)
-                })
-                
-                frame_count += 1
-        except:
-            pass
+        if workers > 1:
+            # Workers open the file themselves
+            self.cap.release()
+            chunks = self._analyze_in_processes(total_frames, workers)
+        else:
+            chunks = [_analyze_frames(self.cap, self.detector, batch_size=self.BATCH_SIZE)]
         
         self.cap.release()
         
+        frame_count = sum(chunk[0] for chunk in chunks)
+        total_vehicles_detected = sum(chunk[1] for chunk in chunks)
+        # Earliest chunk wins ties, as in a sequential scan
+        peak_vehicles, peak_frame = 0, None
+        for _, _, peak, frame in chunks:
+            if frame is not None and (peak_frame is None or peak > peak_vehicles):
+                peak_vehicles, peak_frame = peak, frame
+        
         return {
             'total_frames': frame_count,
             'total_vehicles_detected': total_vehicles_detected,
             'average_vehicles_per_frame': total_vehicles_detected / frame_count if frame_count > 0 else 0,
-            'frame_results': frame_results
+            'peak_vehicles_per_frame': peak_vehicles,
+            'peak_frame': peak_frame
         }
+    
+    def _analyze_in_processes(self, total_frames: int, workers: int) -> List[Tuple]:
+        """
+        Split [0, total_frames) into one time range per worker and analyze them in parallel
+        Returns the results of the ranges that completed, in time order
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        
+        bounds = np.linspace(0, total_frames, workers + 1).astype(int)
+        # Share the cores between workers rather than giving each all of them
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        chunks = []
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(_analyze_video_chunk, self.video_path, int(start), int(end - start),
+                                self.detector.model_type, self.BATCH_SIZE, threads)
+                    for start, end in zip(bounds[:-1], bounds[1:])
+                ]
+                for future in futures:
+                    try:
+                        chunks.append(future.result())
+                    except Exception:
+                        pass
+        except Exception:
+            pass
+        return chunks
 
 
 # Quick start helpers
+def quantize_yolo_model(calibration_frames: List[np.ndarray],
+                        model_path: str = YOLO_FP32_MODEL,
+                        output_path: str = YOLO_OPENVINO_MODEL) -> str:
+    """
+    INT8 post-training quantization of the YOLOv5n OpenVINO model (one-off)
+    calibration_frames: a few hundred representative BGR camera frames
+    Requires openvino and nncf; returns the path of the quantized model
+    """
+    import cv2
+    import nncf
+    import openvino as ov
+    
+    def to_blob(frame):
+        return cv2.dnn.blobFromImage(
+            frame, 1 / 255.0, (YOLO_INPUT_SIZE, YOLO_INPUT_SIZE), swapRB=True, crop=False
+        )
+    
+    model = ov.Core().read_model(model_path)
+    # PERFORMANCE preset: symmetric INT8 with per-channel weight scales
+    quantized = nncf.quantize(
+        model,
+        nncf.Dataset(calibration_frames, to_blob),
+        preset=nncf.QuantizationPreset.PERFORMANCE
+    )
+    ov.save_model(quantized, output_path)
+    return output_path
+
+
 def setup_camera(camera_id: int = 0):
     """Quick setup for camera integration"""
     camera = CameraIntegration(camera_id)
@@ -419,7 +1050,7 @@ def analyze_video_file(video_path: str):
 if __name__ == "__main__":
     print("Computer Vision Module Ready")
     print("Features:")
-    print("- Vehicle detection (Haar Cascade, YOLO, SSD)")
+    print("- Vehicle detection (YOLOv5n on OpenVINO, Haar Cascade, SSD)")
     print("- Lane tracking and counting")
     print("- Traffic flow analysis")
     print("- Camera integration (live and video file)")
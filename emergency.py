@@ -9,6 +9,17 @@ class EmergencyController:
     Gives priority to ambulances, fire trucks, and police vehicles.
     """
     
+    # One controller per junction, polled on every UI refresh
+    __slots__ = ('controller', 'emergency_active', 'emergency_lane', 'emergency_type',
+                 'emergency_start_time', 'override_duration')
+    
+    # Emergency vehicle types (shared by all controllers)
+    EMERGENCY_TYPES = {
+        'ambulance': {'priority': 1, 'color': '#FF6B6B', 'duration': 30},
+        'fire_truck': {'priority': 2, 'color': '#FF0000', 'duration': 40},
+        'police': {'priority': 3, 'color': '#0066FF', 'duration': 25}
+    }
+    
     def __init__(self, traffic_controller):
         """
         Initialize emergency controller.
@@ -22,13 +33,6 @@ class EmergencyController:
         self.emergency_type = None
         self.emergency_start_time = None
         self.override_duration = 30  # seconds
-        
-        # Emergency vehicle types
-        self.EMERGENCY_TYPES = {
-            'ambulance': {'priority': 1, 'color': '#FF6B6B', 'duration': 30},
-            'fire_truck': {'priority': 2, 'color': '#FF0000', 'duration': 40},
-            'police': {'priority': 3, 'color': '#0066FF', 'duration': 25}
-        }
     
     def detect_emergency_vehicle(self, lane, vehicle_type):
         """
@@ -98,14 +102,14 @@ class EmergencyController:
         Returns:
             dict: Emergency status information
         """
+        active = self.emergency_active
         return {
-            'active': self.emergency_active,
+            'active': active,
             'lane': self.emergency_lane,
             'type': self.emergency_type,
             'elapsed_time': self.emergency_start_time,
             'override_duration': self.override_duration,
-            'time_remaining': max(0, self.override_duration - self.emergency_start_time) 
-                             if self.emergency_active else 0
+            'time_remaining': max(0, self.override_duration - self.emergency_start_time) if active else 0
         }
     
     def get_emergency_color(self):
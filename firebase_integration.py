@@ -5,7 +5,10 @@ Enables cloud data sync, real-time updates, and scalability
 
 import json
 import os
+import time
+from collections import defaultdict, deque
 from datetime import datetime
+from itertools import islice
 from typing import Dict, List, Optional
 
 try:
@@ -16,6 +19,12 @@ except ImportError:
     FIREBASE_AVAILABLE = False
 
 
+def _isoformat_ns(timestamp_ns: int) -> str:
+    """Format a time.time_ns() value like datetime.now().isoformat()"""
+    seconds, nanoseconds = divmod(timestamp_ns, 1_000_000_000)
+    return datetime.fromtimestamp(seconds).replace(microsecond=nanoseconds // 1000).isoformat()
+
+
 class FirebaseConfig:
     """Firebase configuration manager"""
     
@@ -57,11 +66,17 @@ class FirebaseConfig:
 class FirebaseRealtimeDB:
     """Firebase Realtime Database wrapper for traffic data"""
     
+    CACHE_SIZE = 1000  # Entries kept per lane for offline support
+    
     def __init__(self, config: FirebaseConfig):
         self.config = config
         self.is_connected = False
-        self.local_cache = {}
+        # Per-lane ring buffers keyed by (junction_id, lane): the oldest
+        # entry drops out once full
+        self.local_cache = defaultdict(lambda: deque(maxlen=self.CACHE_SIZE))
+        self._lanes_by_junction = defaultdict(list)  # junction_id -> its local_cache keys
         self.db_ref = None
+        self._session = None  # Keep-alive HTTP session, created on first push
         
         if config.is_configured and FIREBASE_AVAILABLE:
             try:
@@ -96,13 +111,12 @@ class FirebaseRealtimeDB:
         if self.is_connected:
             try:
                 # Use Firebase REST API to push data
-                import requests
                 db_url = self.db_url.rstrip('/')
                 path = f"traffic/{junction_id}/{lane}.json"
                 url = f"{db_url}/{path}"
                 
                 # Firebase REST API PUT request
-                response = requests.put(url, json=data, timeout=5)
+                response = self._get_session().put(url, json=data, timeout=5)
                 if response.status_code in [200, 201]:
                     print(f"✅ Pushed {junction_id}/{lane} to Firebase")
                     return True
@@ -118,6 +132,58 @@ class FirebaseRealtimeDB:
         
         return True
     
+    def push_traffic_batch(self, junction_data: Dict, timestamp: datetime = None):
+        """
+        Push every lane of a snapshot in one request
+        junction_data: {junction_id: [{'lane', 'vehicles', 'state'}, ...]}
+        Uses a Firebase multi-path update: a single PATCH on the root writes
+        all traffic/<junction>/<lane> nodes atomically
+        """
+        if timestamp is None:
+            timestamp = datetime.now()
+        
+        updates = {}
+        for junction_id, lanes in junction_data.items():
+            for lane_data in lanes:
+                updates[f"traffic/{junction_id}/{lane_data['lane']}"] = {
+                    'junction_id': junction_id,
+                    'lane': lane_data['lane'],
+                    'vehicle_count': lane_data['vehicles'],
+                    'signal_state': lane_data['state'],
+                    'timestamp': timestamp.isoformat()
+                }
+        
+        if self.is_connected and updates:
+            try:
+                db_url = self.db_url.rstrip('/')
+                response = self._get_session().patch(f"{db_url}/.json", json=updates, timeout=5)
+                if response.status_code in [200, 201]:
+                    print(f"✅ Pushed {len(updates)} lanes to Firebase")
+                    return True
+                else:
+                    print(f"Firebase push status: {response.status_code}")
+            except Exception as e:
+                print(f"Firebase push error: {e}")
+        
+        # Use local caching when Firebase is not available or the push failed
+        for data in updates.values():
+            self._cache_locally(data['junction_id'], data['lane'], data)
+        
+        return True
+    
+    def _get_session(self):
+        """
+        Shared requests session for the REST API
+        Reuses pooled keep-alive connections instead of a new TLS handshake per push
+        """
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            
+            self._session = requests.Session()
+            self._session.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=32))
+        return self._session
+    
     def fetch_traffic_data(self, junction_id: str, lane: str = None, limit: int = 100):
         """Fetch historical traffic data from Firebase"""
         
@@ -133,31 +199,31 @@ class FirebaseRealtimeDB:
     
     def _cache_locally(self, junction_id: str, lane: str, data: Dict):
         """Store data locally for offline support"""
-        key = f"{junction_id}:{lane}"
+        key = (junction_id, lane)
         if key not in self.local_cache:
-            self.local_cache[key] = []
+            self._lanes_by_junction[junction_id].append(key)
         self.local_cache[key].append(data)
-        
-        # Keep only last 1000 entries per lane
-        if len(self.local_cache[key]) > 1000:
-            self.local_cache[key] = self.local_cache[key][-1000:]
     
     def _get_cache(self, junction_id: str, lane: str = None, limit: int = 100):
         """Retrieve cached data"""
         results = []
         
         if lane:
-            key = f"{junction_id}:{lane}"
+            key = (junction_id, lane)
             if key in self.local_cache:
-                results = self.local_cache[key][-limit:]
+                results = self._latest(self.local_cache[key], limit)
         else:
             # Return all lanes for this junction
-            for key in self.local_cache:
-                if key.startswith(f"{junction_id}:"):
-                    results.extend(self.local_cache[key][-limit:])
+            for key in self._lanes_by_junction.get(junction_id, ()):
+                results.extend(self._latest(self.local_cache[key], limit))
         
         return results
     
+    @staticmethod
+    def _latest(entries: deque, limit: int) -> List[Dict]:
+        """Last `limit` entries of a ring buffer, oldest first"""
+        return list(islice(entries, max(0, len(entries) - limit), None))
+    
     def sync_to_cloud(self):
         """Sync all cached data to Firebase (for offline-first support)"""
         if not self.is_connected:
@@ -205,18 +271,23 @@ class FirebaseAuth:
 class FirebaseAnalytics:
     """Firebase Analytics integration for traffic data"""
     
+    MAX_EVENTS = 10_000  # Most recent events kept in memory
+    
     def __init__(self, config: FirebaseConfig):
         self.config = config
-        self.events = []
+        self.events = deque(maxlen=self.MAX_EVENTS)
+        # Counts cover every logged event, including those dropped from `events`
+        self.event_counts = {}
     
     def log_event(self, event_name: str, event_params: Dict = None):
         """Log analytics event"""
         event = {
             'name': event_name,
             'parameters': event_params or {},
-            'timestamp': datetime.now().isoformat()
+            'timestamp_ns': time.time_ns()  # Formatted when read
         }
         self.events.append(event)
+        self.event_counts[event_name] = self.event_counts.get(event_name, 0) + 1
         
         if self.config.is_configured:
             try:
@@ -252,18 +323,21 @@ class FirebaseAnalytics:
     def get_analytics_summary(self):
         """Get summary of logged events"""
         return {
-            'total_events': len(self.events),
+            'total_events': sum(self.event_counts.values()),
             'events_by_type': self._group_events_by_name(),
-            'recent_events': self.events[-10:] if self.events else []
+            'recent_events': [
+                {
+                    'name': event['name'],
+                    'parameters': event['parameters'],
+                    'timestamp': _isoformat_ns(event['timestamp_ns'])
+                }
+                for event in islice(self.events, max(0, len(self.events) - 10), None)
+            ]
         }
     
     def _group_events_by_name(self):
         """Group events by event name"""
-        groups = {}
-        for event in self.events:
-            name = event['name']
-            groups[name] = groups.get(name, 0) + 1
-        return groups
+        return dict(self.event_counts)
 
 
 class CloudSyncManager:
@@ -279,7 +353,7 @@ class CloudSyncManager:
         """Add data to sync queue"""
         self.sync_queue.append({
             'data': data,
-            'timestamp': datetime.now(),
+            'timestamp_ns': time.time_ns(),
             'synced': False
         })
     
@@ -329,15 +403,8 @@ class TrafficDataCloud:
         self.sync_manager = CloudSyncManager(self.db, self.analytics)
     
     def push_traffic_snapshot(self, junction_data: Dict):
-        """Push traffic snapshot to cloud"""
-        for junction_id, lanes in junction_data.items():
-            for lane_data in lanes:
-                self.db.push_traffic_data(
-                    junction_id,
-                    lane_data['lane'],
-                    lane_data['vehicles'],
-                    lane_data['state']
-                )
+        """Push traffic snapshot to cloud (all lanes in one request)"""
+        self.db.push_traffic_batch(junction_data)
     
     def get_cloud_status(self):
         """Get overall cloud integration status"""
@@ -4,12 +4,218 @@ Stores, retrieves, and analyzes historical traffic patterns
 for predictive traffic control.
 """
 
+import atexit
+import copy
+import functools
 import json
 import csv
 import os
+import shutil
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Scalar snapshot fields the history aggregations read, kept in a columnar
+# metrics.parquet next to each data.jsonl
+METRIC_COLUMNS = ('hour', 'total_vehicles', 'congestion_level')
+# metrics.parquet stores congestion in uint8 steps of this many percent
+# (exact for the app's 1.5% increments) and vehicle counts as uint16,
+# falling back to wider types for values that don't fit
+CONGESTION_STEP = 0.5
+
+
+def _dump_line(obj):
+    """Serialize one snapshot as a newline-terminated JSON line (bytes)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(
+            obj,
+            option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
+    return (json.dumps(obj) + '\n').encode()
+
+
+_load_line = orjson.loads if ORJSON_AVAILABLE else json.loads
+
+
+def _snapshot_metrics(snapshots):
+    """Extract the METRIC_COLUMNS of a list of snapshots as NumPy arrays"""
+    return {
+        'hour': np.array([datetime.fromisoformat(s['timestamp']).hour for s in snapshots], dtype=np.int8),
+        'total_vehicles': np.array(
+            [s.get('statistics', {}).get('total_vehicles', 0) for s in snapshots], dtype=np.int64
+        ),
+        'congestion_level': np.array([s.get('congestion_level', 0) for s in snapshots], dtype=np.float64)
+    }
+
+
+def _encode_metrics(metrics):
+    """Pack metric columns into a compact pyarrow table for metrics.parquet"""
+    vehicles = metrics['total_vehicles']
+    if len(vehicles) and 0 <= vehicles.min() and vehicles.max() <= np.iinfo(np.uint16).max:
+        vehicles = vehicles.astype(np.uint16)
+    
+    congestion = metrics['congestion_level']
+    steps = congestion / CONGESTION_STEP
+    if len(steps) and 0 <= steps.min() and steps.max() <= np.iinfo(np.uint8).max:
+        congestion = np.rint(steps).astype(np.uint8)
+    else:
+        congestion = congestion.astype(np.float32)
+    
+    return pa.table({'hour': metrics['hour'], 'total_vehicles': vehicles, 'congestion_level': congestion})
+
+
+def _decode_metrics(table):
+    """Metric columns of a metrics.parquet table, widened for arithmetic"""
+    congestion = table.column('congestion_level').to_numpy()
+    if congestion.dtype == np.uint8:
+        congestion = congestion * CONGESTION_STEP
+    return {
+        'hour': table.column('hour').to_numpy(),
+        'total_vehicles': table.column('total_vehicles').to_numpy().astype(np.int64),
+        'congestion_level': congestion.astype(np.float64)
+    }
+
+
+def _hourly_reduce_numpy(hours, values):
+    """
+    Count, sum, max and min of values for each hour of the day.
+    
+    Args:
+        hours (np.ndarray): Hour (0-23) of each value
+        values (np.ndarray): Values to reduce
+        
+    Returns:
+        tuple: (counts, sums, peaks, lows) arrays of length 24; hours
+        without values have a count of 0
+    """
+    hours = hours.astype(np.intp)
+    counts = np.bincount(hours, minlength=24)
+    sums = np.bincount(hours, weights=values, minlength=24)
+    # Start from the overall extremes so every hour's max/min is one of its values
+    peaks = np.full(24, values.min(), dtype=values.dtype)
+    lows = np.full(24, values.max(), dtype=values.dtype)
+    np.maximum.at(peaks, hours, values)
+    np.minimum.at(lows, hours, values)
+    return counts, sums, peaks, lows
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _hourly_reduce(hours, values):
+        """Single-pass loop equivalent of _hourly_reduce_numpy, JIT-compiled."""
+        counts = np.zeros(24, dtype=np.int64)
+        sums = np.zeros(24, dtype=np.float64)
+        peaks = np.empty(24, dtype=values.dtype)
+        lows = np.empty(24, dtype=values.dtype)
+        for i in range(len(hours)):
+            h = hours[i]
+            v = values[i]
+            if counts[h] == 0:
+                peaks[h] = v
+                lows[h] = v
+            else:
+                peaks[h] = max(peaks[h], v)
+                lows[h] = min(lows[h], v)
+            counts[h] += 1
+            sums[h] += v
+        return counts, sums, peaks, lows
+else:
+    _hourly_reduce = _hourly_reduce_numpy
+
+
+def _group_by_hour(hours, values):
+    """
+    Per-hour statistics of values, in hour order.
+    
+    Returns:
+        list: (hour, mean, max, min, count) tuples for hours with data
+    """
+    if len(hours) == 0:
+        return []
+    counts, sums, peaks, lows = _hourly_reduce(hours, values)
+    
+    present = np.flatnonzero(counts)
+    return list(zip(
+        present.tolist(),
+        (sums[present] / counts[present]).tolist(),
+        peaks[present].tolist(),
+        lows[present].tolist(),
+        counts[present].tolist()
+    ))
+
+
+# Managers whose buffered snapshots are flushed at interpreter exit; held
+# weakly so an unused manager (with its index and thread pool) can be freed
+_open_managers = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_open_managers():
+    """Write every live manager's buffered snapshots before exit"""
+    for manager in list(_open_managers):
+        manager.flush()
+
+
+def _flush_if_alive(manager_ref):
+    """Timer callback: flush the manager if it still exists"""
+    manager = manager_ref()
+    if manager is not None:
+        manager.flush()
+
+
+def _memoize_until_saved(method):
+    """
+    Cache an analysis result until the stored history changes.
+    
+    Results are keyed on the method name, today's date (the analysis window
+    ends today), the manager's cache version (bumped by save_snapshot and
+    clear_old_data), the index's data_version (changed by other managers'
+    commits) and the call arguments. The least recently used entries are
+    dropped beyond RESULT_CACHE_SIZE. Callers get a copy, so changing a
+    returned dict never alters later results.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            data_version = self._index.execute('PRAGMA data_version').fetchone()[0]
+        key = (method.__name__, datetime.now().date(), self._cache_version, data_version,
+               args, tuple(sorted(kwargs.items())))
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return copy.deepcopy(self._cache[key])
+        
+        result = self._cache[key] = method(self, *args, **kwargs)
+        if len(self._cache) > self.RESULT_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return copy.deepcopy(result)
+    return wrapper
+
 
 class HistoricalDataManager:
     """
@@ -17,6 +223,12 @@ class HistoricalDataManager:
     Supports local file storage and Firebase cloud sync.
     """
     
+    FLUSH_BYTES = 1 << 20  # Buffered snapshot bytes that trigger a write to disk
+    FLUSH_INTERVAL = 2.0  # Seconds a snapshot may stay buffered before it is written
+    FIREBASE_WORKERS = 4  # Concurrent Firebase uploads (and pooled connections)
+    FIREBASE_BATCH_SIZE = 50  # Snapshots sent per Firebase multi-path update
+    RESULT_CACHE_SIZE = 32  # Analysis results kept by _memoize_until_saved
+    
     def __init__(self, local_dir='traffic_data', firebase_config=None):
         """
         Initialize historical data manager.
@@ -29,12 +241,36 @@ class HistoricalDataManager:
         self.firebase_config = firebase_config
         self.db_url = None
         
+        # Serialized snapshots waiting to be appended, keyed by (date, junction)
+        self._pending = {}
+        self._pending_bytes = 0
+        self._lock = threading.Lock()
+        self._flush_timer = None
+        _open_managers.add(self)
+        
+        # Analysis results, see _memoize_until_saved
+        self._cache = OrderedDict()
+        self._cache_version = 0
+        
         # Create local directory if it doesn't exist
         Path(self.local_dir).mkdir(parents=True, exist_ok=True)
+        self._index = self._open_index()
         
         # Load Firebase config if provided
         if firebase_config:
             self.db_url = firebase_config.get('databaseURL', '').rstrip('/')
+        
+        # Uploads run on background threads over one keep-alive session,
+        # so saving never waits on a TLS handshake or the network
+        self._session = None
+        self._firebase_pool = None
+        self._firebase_pending = []  # Snapshots waiting for the next upload batch
+        if self.db_url:
+            self._session = requests.Session()
+            self._session.mount('https://', HTTPAdapter(pool_maxsize=self.FIREBASE_WORKERS))
+            self._firebase_pool = ThreadPoolExecutor(
+                max_workers=self.FIREBASE_WORKERS, thread_name_prefix='firebase-sync'
+            )
     
     def save_snapshot(self, snapshot_data):
         """
@@ -47,6 +283,13 @@ class HistoricalDataManager:
                 - signal_state (dict): Signal states for all lanes
                 - statistics (dict): Traffic statistics
                 - congestion_level (float): Current congestion %
+        
+        Returns:
+            bool: Whether the snapshot was accepted. It is buffered, not yet
+            on disk: it is written within FLUSH_INTERVAL seconds, once
+            FLUSH_BYTES are buffered, before any read and at exit. Call
+            flush() when it must be durable (e.g. before the process may be
+            killed).
         """
         try:
             # Ensure required fields exist
@@ -70,14 +313,15 @@ class HistoricalDataManager:
             
             # Save to local file (JSON Lines format)
             self._save_local(snapshot_data)
+            self._cache_version += 1
             
-            # Sync to Firebase if configured
+            # Sync to Firebase if configured, in batches on a background
+            # thread; errors are reported by _save_to_firebase and never fail the save
             if self.db_url:
-                try:
-                    self._save_to_firebase(snapshot_data)
-                except Exception as e:
-                    # Firebase is optional, don't fail if it's not available
-                    pass
+                with self._lock:
+                    self._firebase_pending.append(snapshot_data)
+                    if len(self._firebase_pending) >= self.FIREBASE_BATCH_SIZE:
+                        self._send_firebase_locked()
                 
             return True
         except Exception as e:
@@ -88,42 +332,245 @@ class HistoricalDataManager:
         """
         Save snapshot to local file system.
         Uses date-based directory structure for organization.
+        Snapshots are buffered and appended in batches; see flush().
         """
         try:
             date = datetime.fromisoformat(snapshot_data['timestamp']).date()
             junction_id = snapshot_data['junction_id']
             
-            # Directory: traffic_data/2024-01-15/junction_0/
-            dir_path = Path(self.local_dir) / str(date) / f"junction_{junction_id}"
-            dir_path.mkdir(parents=True, exist_ok=True)
-            
-            # File: traffic_data/2024-01-15/junction_0/data.jsonl
-            file_path = dir_path / 'data.jsonl'
-            
-            # Append as JSON Lines (one JSON object per line)
-            with open(file_path, 'a') as f:
-                json.dump(snapshot_data, f)
-                f.write('\n')
+            line = _dump_line(snapshot_data)
+            with self._lock:
+                self._pending.setdefault((str(date), str(junction_id)), []).append(line)
+                self._pending_bytes += len(line)
+                if self._pending_bytes >= self.FLUSH_BYTES:
+                    self._flush_locked()
+                elif self._flush_timer is None:
+                    # Bound how long the snapshot can sit only in memory; the
+                    # timer holds a weak reference so it never keeps self alive
+                    self._flush_timer = threading.Timer(
+                        self.FLUSH_INTERVAL, _flush_if_alive, args=(weakref.ref(self),)
+                    )
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
         except Exception as e:
             print(f"Error in _save_local: {e}")
             raise
     
-    def _save_to_firebase(self, snapshot_data):
+    def flush(self):
         """
-        Save snapshot to Firebase Realtime Database.
+        Append all buffered snapshots to their JSON Lines files and start
+        uploading any still waiting for Firebase.
+        Runs automatically when the buffer fills, FLUSH_INTERVAL seconds
+        after a snapshot is buffered, before reads and at exit.
         """
+        with self._lock:
+            self._flush_locked()
+    
+    def __del__(self):
+        # Don't lose buffered snapshots when an unused manager is freed
         try:
-            timestamp = snapshot_data['timestamp']
-            junction_id = snapshot_data['junction_id']
-            
-            # Create unique key based on timestamp
-            timestamp_key = timestamp.replace(':', '-').replace('.', '-')
-            
-            # Path: historical_data/junction_0/2024-01-15T10-30-45-123456/data
-            path = f"historical_data/junction_{junction_id}/{timestamp_key}/data.json"
-            url = f"{self.db_url}/{path}"
+            self.flush()
+        except Exception:
+            pass
+    
+    def _flush_locked(self):
+        """Write the pending snapshots, one open per file (caller holds the lock)."""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        self._send_firebase_locked()
+        try:
+            while self._pending:
+                (date, junction), lines = self._pending.popitem()
+                file_path = Path(self.local_dir) / self._data_path(date, junction)
+                existed = file_path.exists()
+                metrics_current = PYARROW_AVAILABLE and (not existed or self._metrics_current(file_path))
+                try:
+                    file_path.parent.mkdir(parents=True, exist_ok=True)
+                    with open(file_path, 'ab') as f:
+                        f.write(b''.join(lines))
+                except Exception:
+                    # Keep the unwritten snapshots for the next flush
+                    self._pending[(date, junction)] = lines
+                    raise
+                self._pending_bytes -= sum(len(line) for line in lines)
+                if not existed:
+                    # Restart the count of a file deleted by hand
+                    self._index.execute('DELETE FROM snapshots WHERE date = ? AND junction = ?', (date, junction))
+                self._index.execute(
+                    "INSERT INTO snapshots VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (date, junction) DO UPDATE SET snapshot_count = snapshot_count + excluded.snapshot_count",
+                    (date, junction, self._data_path(date, junction), len(lines))
+                )
+                
+                # Extend the columnar metrics too; if this fails their row count
+                # falls behind the index and they get rebuilt on the next read
+                if metrics_current:
+                    try:
+                        metrics = _snapshot_metrics([_load_line(line) for line in lines])
+                        metrics_file = file_path.with_name('metrics.parquet')
+                        if existed:
+                            # Re-encode the whole day; the new rows may need wider types
+                            stored = _decode_metrics(pq.read_table(metrics_file))
+                            metrics = {name: np.concatenate([stored[name], metrics[name]]) for name in METRIC_COLUMNS}
+                        pq.write_table(_encode_metrics(metrics), metrics_file)
+                    except Exception as e:
+                        print(f"Metrics update error: {e}")
+        finally:
+            # Files already appended stay indexed even if a later one failed
+            self._index.commit()
+    
+    @staticmethod
+    def _data_path(date, junction):
+        """Data file of one junction's day, relative to local_dir."""
+        # File: traffic_data/2024-01-15/junction_0/data.jsonl
+        return f"{date}/junction_{junction}/data.jsonl"
+    
+    def _open_index(self):
+        """
+        Open the index of stored data files, creating it if needed.
+        index.db maps (date, junction) to the day's data file and its
+        snapshot count, so reads look files up instead of listing directories.
+        """
+        index_path = Path(self.local_dir) / 'index.db'
+        
+        index = sqlite3.connect(index_path, check_same_thread=False)  # Used under self._lock
+        index.execute('PRAGMA journal_mode=WAL')
+        index.execute(
+            'CREATE TABLE IF NOT EXISTS snapshots ('
+            'date TEXT, junction TEXT, path TEXT, snapshot_count INTEGER, '
+            'PRIMARY KEY (date, junction))'
+        )
+        
+        # Index data stored before the index existed or copied in since,
+        # and forget files deleted by hand
+        indexed = set(index.execute('SELECT date, junction FROM snapshots'))
+        entries = []
+        for data_file in Path(self.local_dir).glob('*/junction_*/data.jsonl'):
+            date, junction = data_file.parent.parent.name, data_file.parent.name[len('junction_'):]
+            if (date, junction) in indexed:
+                indexed.discard((date, junction))
+                continue
+            try:
+                datetime.strptime(date, '%Y-%m-%d')
+            except ValueError:
+                continue
+            with open(data_file, 'rb') as f:
+                count = sum(1 for line in f if line.strip())
+            entries.append((date, junction, self._data_path(date, junction), count))
+        index.executemany('INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?)', entries)
+        index.executemany('DELETE FROM snapshots WHERE date = ? AND junction = ?', indexed)
+        index.commit()
+        return index
+    
+    def _metrics_current(self, data_file):
+        """
+        Whether data_file's metrics.parquet holds all of its snapshots, i.e.
+        has one row per indexed snapshot (caller holds the lock).
+        """
+        metrics_file = data_file.with_name('metrics.parquet')
+        if not metrics_file.exists():
+            return False
+        date, junction = data_file.parent.parent.name, data_file.parent.name[len('junction_'):]
+        row = self._index.execute(
+            'SELECT snapshot_count FROM snapshots WHERE date = ? AND junction = ?', (date, junction)
+        ).fetchone()
+        return row is not None and pq.read_metadata(metrics_file).num_rows == row[0]
+    
+    def _load_metrics(self, data_file):
+        """
+        Read the METRIC_COLUMNS of one junction's day of data (caller holds
+        the lock). Uses metrics.parquet when it is current, otherwise parses
+        the JSON Lines and (re)writes it.
+        """
+        metrics_file = data_file.with_name('metrics.parquet')
+        if PYARROW_AVAILABLE and self._metrics_current(data_file):
+            return _decode_metrics(pq.read_table(metrics_file, columns=list(METRIC_COLUMNS)))
+        
+        with open(data_file, 'rb') as f:
+            metrics = _snapshot_metrics([_load_line(line) for line in f if line.strip()])
+        if PYARROW_AVAILABLE:
+            table = _encode_metrics(metrics)
+            pq.write_table(table, metrics_file)
+            # Same (quantized) values as later reads of the file
+            metrics = _decode_metrics(table)
+        return metrics
+    
+    def _get_metrics(self, days, junction_id=None):
+        """
+        METRIC_COLUMNS of all snapshots from the last `days` days.
+        
+        Returns:
+            tuple: (dict of NumPy arrays, start_date, end_date)
+        """
+        end_date = datetime.now().date()
+        start_date = end_date - timedelta(days=days-1)
+        
+        chunks = []
+        with self._lock:
+            self._flush_locked()
+            for data_file in self._data_files(start_date, end_date, junction_id):
+                chunks.append(self._load_metrics(data_file))
+        
+        if not chunks:
+            chunks = [_snapshot_metrics([])]
+        metrics = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in METRIC_COLUMNS}
+        return metrics, start_date, end_date
+    
+    def _data_files(self, start_date, end_date, junction_id=None):
+        """
+        Data files stored from start_date to end_date (inclusive), optionally
+        for just one junction, looked up in the index (caller holds the lock).
+        """
+        query = 'SELECT date, junction, path FROM snapshots WHERE date BETWEEN ? AND ?'
+        params = [str(start_date), str(end_date)]
+        if junction_id is not None:
+            query += ' AND junction = ?'
+            params.append(str(junction_id))
+        
+        data_files = []
+        missing = []
+        for date, junction, path in self._index.execute(query + ' ORDER BY date', params).fetchall():
+            data_file = Path(self.local_dir) / path
+            if data_file.exists():
+                data_files.append(data_file)
+            else:
+                # Deleted outside this manager; drop it from the index
+                missing.append((date, junction))
+        if missing:
+            self._index.executemany('DELETE FROM snapshots WHERE date = ? AND junction = ?', missing)
+            self._index.commit()
+        return data_files
+    
+    def _send_firebase_locked(self):
+        """Hand the waiting snapshots to a background upload (caller holds the lock)."""
+        if not self._firebase_pending:
+            return
+        batch, self._firebase_pending = self._firebase_pending, []
+        try:
+            self._firebase_pool.submit(self._save_to_firebase, batch)
+        except RuntimeError:
+            # Worker threads are gone at interpreter exit; upload inline
+            self._save_to_firebase(batch)
+    
+    def _save_to_firebase(self, snapshots):
+        """
+        Save snapshots to Firebase Realtime Database.
+        One multi-path update (PATCH on the root) writes the whole batch.
+        """
+        try:
+            updates = {}
+            for snapshot_data in snapshots:
+                timestamp = snapshot_data['timestamp']
+                junction_id = snapshot_data['junction_id']
+                
+                # Create unique key based on timestamp
+                timestamp_key = timestamp.replace(':', '-').replace('.', '-')
+                
+                # Path: historical_data/junction_0/2024-01-15T10-30-45-123456/data
+                updates[f"historical_data/junction_{junction_id}/{timestamp_key}/data"] = snapshot_data
             
-            response = requests.put(url, json=snapshot_data, timeout=5)
+            response = self._session.patch(f"{self.db_url}/.json", json=updates, timeout=5)
             
             if response.status_code not in [200, 201]:
                 print(f"Firebase save warning: {response.status_code}")
@@ -142,37 +589,17 @@ class HistoricalDataManager:
         Returns:
             list: Historical snapshots
         """
-        # Convert date to string format YYYY-MM-DD
-        if isinstance(date, datetime):
-            date_str = date.strftime('%Y-%m-%d')
-        elif hasattr(date, 'strftime'):  # datetime.date object
-            date_str = date.strftime('%Y-%m-%d')
-        else:
-            date_str = str(date)
-        
+        date_str = self._date_string(date)
         data = []
-        date_dir = Path(self.local_dir) / date_str
         
-        if not date_dir.exists():
-            return data
+        with self._lock:
+            self._flush_locked()
+            data_files = self._data_files(date_str, date_str, junction_id)
         
-        # Iterate through all junction directories
-        for junction_dir in date_dir.iterdir():
-            if not junction_dir.is_dir():
-                continue
-            
-            # Filter by junction_id if specified
-            if junction_id is not None:
-                if not junction_dir.name.endswith(f"_{junction_id}"):
-                    continue
-            
-            # Read JSONL file
-            data_file = junction_dir / 'data.jsonl'
-            if data_file.exists():
-                with open(data_file, 'r') as f:
-                    for line in f:
-                        if line.strip():
-                            data.append(json.loads(line))
+        # Read each junction's JSONL file
+        for data_file in data_files:
+            with open(data_file, 'rb') as f:
+                data.extend([_load_line(line) for line in f if line.strip()])
         
         return data
     
@@ -190,16 +617,42 @@ class HistoricalDataManager:
         if date is None:
             date = datetime.now()
         
-        data = self.get_data_by_date(date)
         hour_data = []
         
-        for snapshot in data:
-            snapshot_hour = datetime.fromisoformat(snapshot['timestamp']).hour
-            if snapshot_hour == hour:
-                hour_data.append(snapshot)
+        if not PYARROW_AVAILABLE:
+            for snapshot in self.get_data_by_date(date):
+                snapshot_hour = datetime.fromisoformat(snapshot['timestamp']).hour
+                if snapshot_hour == hour:
+                    hour_data.append(snapshot)
+            return hour_data
+        
+        # The hour column of metrics.parquet lines up with the snapshots in
+        # data.jsonl, so only that hour's lines need decoding
+        date_str = self._date_string(date)
+        with self._lock:
+            self._flush_locked()
+            data_files = self._data_files(date_str, date_str)
+            file_hours = [self._load_metrics(data_file)['hour'] for data_file in data_files]
+        
+        for data_file, hours in zip(data_files, file_hours):
+            wanted = set(np.flatnonzero(hours == hour).tolist())
+            if not wanted:
+                continue
+            with open(data_file, 'rb') as f:
+                lines = (line for line in f if line.strip())
+                hour_data.extend([_load_line(line) for i, line in enumerate(lines) if i in wanted])
         
         return hour_data
     
+    @staticmethod
+    def _date_string(date):
+        """Convert a date, datetime or string to YYYY-MM-DD format."""
+        if isinstance(date, datetime):
+            return date.strftime('%Y-%m-%d')
+        elif hasattr(date, 'strftime'):  # datetime.date object
+            return date.strftime('%Y-%m-%d')
+        return str(date)
+    
     def get_data_range(self, start_date, end_date, junction_id=None):
         """
         Retrieve data for a date range.
@@ -212,6 +665,10 @@ class HistoricalDataManager:
         Returns:
             list: All snapshots in range
         """
+        return list(self._iter_data_range(start_date, end_date, junction_id))
+    
+    def _iter_data_range(self, start_date, end_date, junction_id=None):
+        """Yield the snapshots from start_date to end_date one at a time."""
         # Normalize start_date to date object
         if isinstance(start_date, str):
             start_date = datetime.fromisoformat(start_date).date()
@@ -224,15 +681,17 @@ class HistoricalDataManager:
         elif isinstance(end_date, datetime):
             end_date = end_date.date()
         
-        data = []
-        current_date = start_date
+        with self._lock:
+            self._flush_locked()
+            data_files = self._data_files(start_date, end_date, junction_id)
         
-        while current_date <= end_date:
-            data.extend(self.get_data_by_date(current_date, junction_id))
-            current_date += timedelta(days=1)
-        
-        return data
+        for data_file in data_files:
+            with open(data_file, 'rb') as f:
+                for line in f:
+                    if line.strip():
+                        yield _load_line(line)
     
+    @_memoize_until_saved
     def get_peak_hours_history(self, days=7, junction_id=None):
         """
         Analyze peak traffic hours from historical data.
@@ -244,33 +703,21 @@ class HistoricalDataManager:
         Returns:
             dict: Peak hours with statistics
         """
-        end_date = datetime.now().date()
-        start_date = end_date - timedelta(days=days-1)
-        
-        hourly_vehicles = {}
-        
-        data = self.get_data_range(start_date, end_date, junction_id)
-        
-        for snapshot in data:
-            hour = datetime.fromisoformat(snapshot['timestamp']).hour
-            vehicles = snapshot['statistics'].get('total_vehicles', 0)
-            
-            if hour not in hourly_vehicles:
-                hourly_vehicles[hour] = []
-            hourly_vehicles[hour].append(vehicles)
+        metrics, _, _ = self._get_metrics(days, junction_id)
         
         # Calculate averages and patterns
         peak_analysis = {}
-        for hour, vehicle_list in hourly_vehicles.items():
+        for hour, average, peak, low, count in _group_by_hour(metrics['hour'], metrics['total_vehicles']):
             peak_analysis[hour] = {
-                'average_vehicles': sum(vehicle_list) / len(vehicle_list),
-                'peak_vehicles': max(vehicle_list),
-                'min_vehicles': min(vehicle_list),
-                'occurrences': len(vehicle_list)
+                'average_vehicles': average,
+                'peak_vehicles': peak,
+                'min_vehicles': low,
+                'occurrences': count
             }
         
         return peak_analysis
     
+    @_memoize_until_saved
     def get_congestion_patterns(self, days=7, junction_id=None):
         """
         Get congestion patterns for predictive analysis.
@@ -282,28 +729,15 @@ class HistoricalDataManager:
         Returns:
             dict: Hourly congestion patterns
         """
-        end_date = datetime.now().date()
-        start_date = end_date - timedelta(days=days-1)
-        
-        hourly_congestion = {}
-        
-        data = self.get_data_range(start_date, end_date, junction_id)
-        
-        for snapshot in data:
-            hour = datetime.fromisoformat(snapshot['timestamp']).hour
-            congestion = snapshot.get('congestion_level', 0)
-            
-            if hour not in hourly_congestion:
-                hourly_congestion[hour] = []
-            hourly_congestion[hour].append(congestion)
+        metrics, _, _ = self._get_metrics(days, junction_id)
         
         # Calculate statistics
         patterns = {}
-        for hour, congestion_list in hourly_congestion.items():
+        for hour, average, peak, low, _ in _group_by_hour(metrics['hour'], metrics['congestion_level']):
             patterns[hour] = {
-                'average_congestion': sum(congestion_list) / len(congestion_list),
-                'peak_congestion': max(congestion_list),
-                'min_congestion': min(congestion_list)
+                'average_congestion': average,
+                'peak_congestion': peak,
+                'min_congestion': low
             }
         
         return patterns
@@ -322,44 +756,42 @@ class HistoricalDataManager:
             bool: Success status
         """
         try:
-            data = self.get_data_range(start_date, end_date, junction_id)
-            
-            if not data:
+            # Stream the snapshots twice rather than holding them: once for
+            # the lane columns, once to write the rows
+            lanes = set()
+            snapshot_count = 0
+            for snapshot in self._iter_data_range(start_date, end_date, junction_id):
+                lanes.update(snapshot.get('statistics', {}).get('vehicles_per_lane', {}))
+                snapshot_count += 1
+            
+            if not snapshot_count:
                 return False
             
-            # Flatten data for CSV
-            rows = []
-            for snapshot in data:
-                row = {
-                    'timestamp': snapshot['timestamp'],
-                    'junction_id': snapshot['junction_id'],
-                    'total_vehicles': snapshot['statistics'].get('total_vehicles', 0),
-                    'congestion_level': snapshot.get('congestion_level', 0),
-                    'recorded_at': snapshot.get('recorded_at', '')
-                }
-                
-                # Add per-lane data
-                vehicles = snapshot.get('statistics', {}).get('vehicles_per_lane', {})
-                for lane, count in vehicles.items():
-                    row[f"vehicles_{lane}"] = count
-                
-                rows.append(row)
-            
-            # Write CSV
-            if rows:
-                keys = rows[0].keys()
-                with open(output_file, 'w', newline='') as f:
-                    writer = csv.DictWriter(f, fieldnames=keys)
-                    writer.writeheader()
-                    writer.writerows(rows)
-                return True
-            
-            return False
+            lanes = sorted(lanes)
+            header = ['timestamp', 'junction_id', 'total_vehicles', 'congestion_level', 'recorded_at']
+            header += [f"vehicles_{lane}" for lane in lanes]
+            
+            with open(output_file, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(header)
+                for snapshot in self._iter_data_range(start_date, end_date, junction_id):
+                    statistics = snapshot.get('statistics', {})
+                    vehicles = statistics.get('vehicles_per_lane', {})
+                    writer.writerow((
+                        snapshot['timestamp'],
+                        snapshot['junction_id'],
+                        statistics.get('total_vehicles', 0),
+                        snapshot.get('congestion_level', 0),
+                        snapshot.get('recorded_at', ''),
+                        *[vehicles.get(lane, 0) for lane in lanes]
+                    ))
+            return True
             
         except Exception as e:
             print(f"CSV export error: {e}")
             return False
     
+    @_memoize_until_saved
     def get_statistics_summary(self, days=7, junction_id=None):
         """
         Get comprehensive statistics from historical data.
@@ -371,25 +803,21 @@ class HistoricalDataManager:
         Returns:
             dict: Comprehensive statistics
         """
-        end_date = datetime.now().date()
-        start_date = end_date - timedelta(days=days-1)
+        metrics, start_date, end_date = self._get_metrics(days, junction_id)
+        all_vehicles = metrics['total_vehicles']
+        all_congestion = metrics['congestion_level']
         
-        data = self.get_data_range(start_date, end_date, junction_id)
-        
-        if not data:
+        if len(all_vehicles) == 0:
             return {'status': 'No data available'}
         
-        all_vehicles = [s['statistics'].get('total_vehicles', 0) for s in data]
-        all_congestion = [s.get('congestion_level', 0) for s in data]
-        
         return {
             'days_analyzed': days,
-            'total_snapshots': len(data),
-            'total_vehicles': sum(all_vehicles),
-            'average_vehicles_per_snapshot': sum(all_vehicles) / len(all_vehicles) if all_vehicles else 0,
-            'peak_vehicles': max(all_vehicles) if all_vehicles else 0,
-            'average_congestion': sum(all_congestion) / len(all_congestion) if all_congestion else 0,
-            'peak_congestion': max(all_congestion) if all_congestion else 0,
+            'total_snapshots': len(all_vehicles),
+            'total_vehicles': int(all_vehicles.sum()),
+            'average_vehicles_per_snapshot': float(all_vehicles.mean()),
+            'peak_vehicles': int(all_vehicles.max()),
+            'average_congestion': float(all_congestion.mean()),
+            'peak_congestion': float(all_congestion.max()),
             'date_range': f"{start_date} to {end_date}"
         }
     
@@ -403,21 +831,26 @@ class HistoricalDataManager:
         Returns:
             int: Number of directories deleted
         """
-        cutoff_date = datetime.now().date() - timedelta(days=days_to_keep)
+        cutoff = str(datetime.now().date() - timedelta(days=days_to_keep))
         deleted_count = 0
         
-        for date_dir in Path(self.local_dir).iterdir():
-            if not date_dir.is_dir():
-                continue
-            
-            try:
-                dir_date = datetime.strptime(date_dir.name, '%Y-%m-%d').date()
-                if dir_date < cutoff_date:
-                    import shutil
+        with self._lock:
+            # Buffered snapshots would otherwise recreate deleted directories
+            self._flush_locked()
+            
+            # ISO dates sort as strings
+            old_dates = self._index.execute(
+                'SELECT DISTINCT date FROM snapshots WHERE date < ?', (cutoff,)
+            ).fetchall()
+            for (date,) in old_dates:
+                date_dir = Path(self.local_dir) / date
+                if date_dir.exists():
                     shutil.rmtree(date_dir)
                     deleted_count += 1
-            except ValueError:
-                continue
+            
+            self._index.execute('DELETE FROM snapshots WHERE date < ?', (cutoff,))
+            self._index.commit()
+            self._cache_version += 1
         
         return deleted_count
 
@@ -3,6 +3,10 @@ Traffic Signal Timing Logic Module
 Handles dynamic signal duration calculation based on vehicle density.
 """
 
+# Signal phases; get_signal_state reports each lane's index as 'signal_id'
+SIGNALS = ('RED', 'GREEN', 'YELLOW')
+RED, GREEN, YELLOW = range(len(SIGNALS))
+
 class TrafficSignalController:
     """
     Manages traffic signal timing for a 4-way junction.
@@ -143,17 +147,15 @@ class TrafficSignalController:
             )
             
             # Determine signal state
-            if lane_name == self.current_lane:
-                signal = 'GREEN'
-            else:
-                signal = 'RED'
+            signal_id = GREEN if lane_name == self.current_lane else RED
             
             # Calculate congestion level
             congestion = self.calculate_congestion_level(lane_data['vehicles'])
             
             signal_state[lane_name] = {
                 'vehicles': lane_data['vehicles'],
-                'signal': signal,
+                'signal': SIGNALS[signal_id],
+                'signal_id': signal_id,
                 'green_time': green_time,
                 'congestion': congestion
             }
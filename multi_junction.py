@@ -7,6 +7,8 @@ from logic import TrafficSignalController
 from datetime import datetime
 import json
 
+JUNCTION_NAMES = ('Downtown', 'Midtown', 'Uptown', 'Suburb')
+
 class MultiJunctionController:
     """
     Manages multiple traffic signal intersections with coordination.
@@ -27,15 +29,37 @@ class MultiJunctionController:
         self.total_vehicle_capacity = 100  # Total vehicles across all junctions
         
         # Initialize junctions with unique names
-        junction_names = ['Downtown', 'Midtown', 'Uptown', 'Suburb']
         for i in range(self.num_junctions):
-            self.junctions[i] = {
-                'name': junction_names[i],
-                'controller': TrafficSignalController(),
-                'total_vehicles': 0,
-                'efficiency_score': 0.0,
-                'active': True
-            }
+            self.junctions[i] = self._new_junction(i)
+    
+    def _new_junction(self, junction_id):
+        """Create the state for a fresh junction."""
+        return {
+            'name': JUNCTION_NAMES[junction_id],
+            'controller': TrafficSignalController(),
+            'total_vehicles': 0,
+            'efficiency_score': 0.0,
+            'active': True
+        }
+    
+    def resize(self, num_junctions):
+        """
+        Change the number of junctions in place.
+        
+        Existing junctions keep their controllers and state; new ones are
+        appended and surplus ones removed from the end.
+        
+        Args:
+            num_junctions (int): New number of intersections (2-4)
+        """
+        num_junctions = max(2, min(num_junctions, 4))
+        for i in range(self.num_junctions, num_junctions):
+            self.junctions[i] = self._new_junction(i)
+        for i in range(num_junctions, self.num_junctions):
+            del self.junctions[i]
+        
+        self.num_junctions = num_junctions
+        self.active_junction = min(self.active_junction, num_junctions - 1)
     
     def set_active_junction(self, junction_id):
         """Set the currently active junction for viewing/control."""
@@ -71,11 +95,38 @@ class MultiJunctionController:
             self.junctions[junction_id]['controller'].set_vehicle_count(lane, count)
             self._update_junction_stats(junction_id)
     
+    def set_vehicle_counts(self, junction_id, counts):
+        """
+        Set vehicle counts for several lanes of a junction at once.
+        
+        Lanes whose count is unchanged are skipped, and junction statistics
+        are recalculated once, only if some lane actually changed.
+        
+        Args:
+            junction_id (int): Junction identifier
+            counts (dict): Lane direction -> number of vehicles
+            
+        Returns:
+            bool: True if any lane count changed
+        """
+        if junction_id not in self.junctions:
+            return False
+        
+        controller = self.junctions[junction_id]['controller']
+        changed = False
+        for lane, count in counts.items():
+            if lane in controller.lanes and controller.lanes[lane]['vehicles'] != count:
+                controller.set_vehicle_count(lane, count)
+                changed = True
+        
+        if changed:
+            self._update_junction_stats(junction_id)
+        return changed
+    
     def _update_junction_stats(self, junction_id):
         """Calculate statistics for a junction."""
         controller = self.junctions[junction_id]['controller']
-        state = controller.get_signal_state()
-        total = sum(state[lane]['vehicles'] for lane in state)
+        total = sum(lane['vehicles'] for lane in controller.lanes.values())
         self.junctions[junction_id]['total_vehicles'] = total
     
     def advance_signal(self, junction_id=None):
@@ -111,14 +162,19 @@ class MultiJunctionController:
             }
         return all_state
     
-    def get_system_health(self):
+    def get_system_health(self, all_state=None):
         """
         Calculate overall system health metrics.
         
+        Args:
+            all_state (dict): Result of get_all_junctions_state(), if the
+                caller already has it
+        
         Returns:
             dict: System-wide metrics
         """
-        all_state = self.get_all_junctions_state()
+        if all_state is None:
+            all_state = self.get_all_junctions_state()
         
         total_vehicles = sum(
             state['total_vehicles'] for state in all_state.values()
@@ -164,15 +220,20 @@ class MultiJunctionController:
             priority = 1 - (rank / self.num_junctions)  # 1.0 to near 0
             self.junctions[junc_id]['priority'] = priority
     
-    def get_coordination_recommendations(self):
+    def get_coordination_recommendations(self, all_state=None):
         """
         Get recommendations for traffic flow optimization.
         
+        Args:
+            all_state (dict): Result of get_all_junctions_state(), if the
+                caller already has it
+        
         Returns:
             list: List of optimization suggestions
         """
         recommendations = []
-        all_state = self.get_all_junctions_state()
+        if all_state is None:
+            all_state = self.get_all_junctions_state()
         
         # Check for bottlenecks
         for junc_id, state in all_state.items():
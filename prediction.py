@@ -53,19 +53,29 @@ class TrafficPredictor:
         Predict traffic for next N hours using multiple methods
         Returns: predictions with confidence intervals
         """
+        return self._predict_lane(self.get_historical_df(), lane, hours_ahead)
+    
+    def predict_lanes(self, lanes, hours_ahead=4):
+        """
+        Predict traffic for several lanes, building the history DataFrame once
+        Returns: dict of lane -> predictions
+        """
         df = self.get_historical_df()
-        
+        return {lane: self._predict_lane(df, lane, hours_ahead) for lane in lanes}
+    
+    def _predict_lane(self, df, lane, hours_ahead):
+        """Pick the best available forecast for one lane from a history DataFrame"""
         if df is None or len(df) < 5:
-            return self._simple_forecast(lane, hours_ahead)
+            return self._simple_forecast(lane, hours_ahead, df)
         
         lane_data = df[df['lane'] == lane].copy()
         if len(lane_data) < 5:
-            return self._simple_forecast(lane, hours_ahead)
+            return self._simple_forecast(lane, hours_ahead, df)
         
         predictions = {}
         
         # Method 1: Time-based averaging (always available)
-        predictions['simple'] = self._simple_forecast(lane, hours_ahead)
+        predictions['simple'] = self._simple_forecast(lane, hours_ahead, df)
         
         # Method 2: ARIMA (if statsmodels available)
         if STATSMODELS_AVAILABLE and len(lane_data) >= 10:
@@ -83,12 +93,13 @@ class TrafficPredictor:
         else:
             return predictions['simple']
     
-    def _simple_forecast(self, lane, hours_ahead):
+    def _simple_forecast(self, lane, hours_ahead, df=None):
         """
         Simple forecast based on historical hourly patterns
         Works without external ML libraries
         """
-        df = self.get_historical_df()
+        if df is None:
+            df = self.get_historical_df()
         
         if df is None or len(df) == 0:
             # Return baseline predictions
@@ -279,8 +290,7 @@ class TrafficPredictor:
         """Predict which lanes will be congested in next 4 hours"""
         forecasts = {}
         
-        for lane in lanes:
-            pred = self.predict_next_hours(lane, hours_ahead=4)
+        for lane, pred in self.predict_lanes(lanes, hours_ahead=4).items():
             congestion_risk = sum(1 for p in pred if p['predicted_vehicles'] > threshold) / len(pred)
             
             forecasts[lane] = {
@@ -318,8 +328,7 @@ class SmartTrafficOptimizer:
         lanes = ['North', 'East', 'South', 'West']
         recommendations = []
         
-        for lane in lanes:
-            forecast = self.predictor.predict_next_hours(lane, hours_ahead=2)
+        for lane, forecast in self.predictor.predict_lanes(lanes, hours_ahead=2).items():
             if forecast and forecast[0]['predicted_vehicles'] > 60:
                 recommendations.append(f"Consider extending {lane} lane green time in next hour")
         
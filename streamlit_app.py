@@ -5,21 +5,50 @@ Google Technologies Integration: Maps, Charts, Real-time Analytics
 """
 
 import streamlit as st
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-import folium
-from streamlit_folium import st_folium
 from pathlib import Path
-from logic import TrafficSignalController
+from logic import TrafficSignalController, SIGNALS
 from multi_junction import MultiJunctionController
 from emergency import EmergencyController
 from analytics import TrafficAnalytics
-from prediction import TrafficPredictor
 from historical_data import HistoricalDataManager, PredictiveTrafficAnalyzer
 import json
+import gzip
+import time
+
+# Signal display lookups, indexed by the controller's 'signal_id'
+SIGNAL_COLORS = ('#ff6b6b', '#51cf66', '#ffd43b')
+SIGNAL_EMOJIS = ('🔴', '🟢', '🟡')
+MAP_MARKER_COLORS = ('red', 'green', 'orange')
+
+# Signal card HTML, filled with str.format_map. No blank lines inside, so
+# several cards can be joined into one markdown HTML block.
+SIGNAL_CARD_TEMPLATE = """<div style="background-color: {color}; padding: 20px; border-radius: 10px;
+    text-align: center; color: white; margin: 10px 0;">
+    <h3 style="margin: 0; color: white;">{emoji} {lane}</h3>
+    <p>Signal: <strong>{signal}</strong></p>
+    <p>Vehicles: {vehicles}</p>
+    <p>Green Time: {green_time}s</p>
+</div>"""
+
+MINI_CARD_TEMPLATE = """<div style="background-color: {color}; padding: 15px; border-radius: 8px;
+    text-align: center; color: white; margin: 5px 0;">
+    <h4 style="margin: 0; color: white;">{emoji} {lane}</h4>
+    <p style="margin: 3px 0; font-size: 12px;">{vehicles} vehicles</p>
+    <p style="margin: 3px 0; font-size: 11px;">{green_time}s green</p>
+</div>"""
+
+# One row of the multi-junction network: name and counters beside the
+# junction's mini signal cards
+JUNCTION_ROW_TEMPLATE = """<div class="junction-row">
+    <div>
+        <h3>{name}</h3>
+        <p class="junction-stat">Vehicles<br><strong>{vehicles}</strong></p>
+        <p class="junction-stat">Cycle<br><strong>{cycle}</strong></p>
+    </div>
+    <div class="signal-grid-4">{mini_cards}</div>
+</div>"""
 
 # ============================================================================
 # PAGE CONFIGURATION
@@ -31,8 +60,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS for better stylingsee
-st.markdown("""
+# Custom CSS for better styling. It has to be re-emitted on every rerun
+# (Streamlit drops elements a rerun does not write), so whitespace is
+# collapsed once at import to keep that delta small.
+CUSTOM_CSS = " ".join("""
     <style>
     .metric-card {
         padding: 20px;
@@ -47,6 +78,30 @@ st.markdown("""
         border-left: 5px solid #FF0000;
         margin: 10px 0;
     }
+    .signal-grid {
+        display: grid;
+        grid-template-columns: 1fr 1fr;
+        gap: 10px;
+    }
+    .signal-grid-4 {
+        display: grid;
+        grid-template-columns: repeat(4, 1fr);
+        gap: 10px;
+    }
+    .junction-row {
+        display: grid;
+        grid-template-columns: 1fr 3fr;
+        gap: 10px;
+        align-items: center;
+        margin-bottom: 10px;
+    }
+    .junction-stat {
+        margin: 4px 0;
+    }
+    .junction-stat strong {
+        font-size: 1.75rem;
+        font-weight: normal;
+    }
     .signal-green {
         color: #00ff00;
         font-weight: bold;
@@ -56,34 +111,53 @@ st.markdown("""
         font-weight: bold;
     }
     </style>
-    """, unsafe_allow_html=True)
+""".split())
+
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 # ============================================================================
 # INITIALIZATION
 # ============================================================================
-if 'multi_controller' not in st.session_state:
-    st.session_state.multi_controller = MultiJunctionController(num_junctions=2)
-    st.session_state.emergency_controllers = {}
-    st.session_state.analytics = TrafficAnalytics()
-    st.session_state.traffic_predictor = TrafficPredictor()
-    st.session_state.simulation_active = False
-    st.session_state.update_counter = 0
-    st.session_state.selected_mode = 'single'  # 'single' or 'multi'
-    
-    # Initialize historical data manager
+# pandas, matplotlib and folium are imported inside the modes and helpers
+# that use them, so a session only pays for the libraries its mode needs.
+@st.cache_resource
+def get_historical_manager():
+    """Build the shared historical data manager (its write buffer is locked, safe to share)."""
     try:
         with open('firebase-config.json', 'r') as f:
             firebase_config = json.load(f)
-        st.session_state.historical_manager = HistoricalDataManager(
+        return HistoricalDataManager(
             local_dir='traffic_data',
             firebase_config=firebase_config
         )
     except:
-        st.session_state.historical_manager = HistoricalDataManager(local_dir='traffic_data')
-    
-    st.session_state.predictive_analyzer = PredictiveTrafficAnalyzer(
-        st.session_state.historical_manager
-    )
+        return HistoricalDataManager(local_dir='traffic_data')
+
+@st.cache_resource
+def get_predictive_analyzer():
+    """Build the shared predictive analyzer (it only reads the historical manager)."""
+    return PredictiveTrafficAnalyzer(get_historical_manager())
+
+def get_traffic_predictor():
+    """
+    Get the session's ML predictor, creating it on first use.
+    
+    prediction pulls in pandas, statsmodels and sklearn, so it is only
+    imported once a mode actually needs forecasts.
+    """
+    if 'traffic_predictor' not in st.session_state:
+        from prediction import TrafficPredictor
+        st.session_state.traffic_predictor = TrafficPredictor()
+    return st.session_state.traffic_predictor
+
+
+if 'multi_controller' not in st.session_state:
+    st.session_state.multi_controller = MultiJunctionController(num_junctions=2)
+    st.session_state.emergency_controllers = {}
+    st.session_state.analytics = TrafficAnalytics()
+    st.session_state.simulation_active = False
+    st.session_state.update_counter = 0
+    st.session_state.selected_mode = 'single'  # 'single' or 'multi'
     
     # Initialize emergency controllers for each junction
     for junc_id in range(2):
@@ -93,15 +167,21 @@ if 'multi_controller' not in st.session_state:
 multi_controller = st.session_state.multi_controller
 emergency_controllers = st.session_state.emergency_controllers
 analytics = st.session_state.analytics
-traffic_predictor = st.session_state.traffic_predictor
-historical_manager = st.session_state.historical_manager
-predictive_analyzer = st.session_state.predictive_analyzer
+# Stateless services are shared by every session; only the controllers and
+# analytics above are per-session state
+historical_manager = get_historical_manager()
+predictive_analyzer = get_predictive_analyzer()
 
 # ============================================================================
 # AUTO-SYNC TO FIREBASE FUNCTION
 # ============================================================================
-def sync_junction_to_firebase(junction_id):
-    """Auto-sync junction state to Firebase - stores ALL changes as history"""
+def sync_junction_to_firebase(junction_id, signal_state=None, stats=None):
+    """
+    Auto-sync junction state to Firebase - stores ALL changes as history
+    
+    Pass signal_state/stats when the caller already has them for this
+    junction, to avoid recomputing them.
+    """
     try:
         import requests
         with open('firebase-config.json', 'r') as f:
@@ -114,8 +194,10 @@ def sync_junction_to_firebase(junction_id):
             return False
         
         controller = multi_controller.junctions[junction_id]['controller']
-        stats = controller.get_statistics()
-        signal_state = controller.get_signal_state()
+        if stats is None:
+            stats = controller.get_statistics()
+        if signal_state is None:
+            signal_state = controller.get_signal_state()
         
         # Prepare detailed data
         data = {
@@ -149,6 +231,200 @@ def sync_junction_to_firebase(junction_id):
     except Exception as e:
         return False
 
+SIMULATION_INTERVAL = 3  # seconds between simulation steps
+
+def simulation_step_due(key):
+    """
+    Report whether the running simulation is due for its next step.
+    
+    Steps are paced by wall-clock time, so reruns triggered by widgets
+    in between do not advance the signals early.
+    """
+    if not st.session_state.simulation_active:
+        st.session_state.pop(key, None)
+        return False
+    
+    now = time.monotonic()
+    last_step = st.session_state.get(key)
+    if last_step is None:
+        st.session_state[key] = now
+        return False
+    if now - last_step < SIMULATION_INTERVAL * 0.9:
+        return False
+    
+    st.session_state[key] = now
+    return True
+
+def run_live_panel(panel):
+    """Run a panel as a fragment that reruns itself while simulating."""
+    run_every = SIMULATION_INTERVAL if st.session_state.simulation_active else None
+    st.fragment(run_every=run_every)(panel)()
+
+@st.cache_resource
+def get_pyplot():
+    """Import pyplot on first use, with the non-interactive Agg backend."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+@st.cache_data(max_entries=64)
+def forecast_series(lane_vehicles, prediction_hours):
+    """
+    Per-lane trend lines for the forecast chart.
+    
+    Each lane starts at its current count and follows a seeded random walk
+    clamped at zero, so reruns with the same state draw the same lines.
+    
+    Args:
+        lane_vehicles (tuple): Current vehicles per lane
+        prediction_hours (int): Hours to forecast
+        
+    Returns:
+        np.ndarray: (lanes, prediction_hours) vehicle counts
+    """
+    rng = np.random.RandomState(42)
+    variations = rng.normal(0, 3, size=(len(lane_vehicles), prediction_hours - 1))
+    predictions = np.empty((len(lane_vehicles), prediction_hours))
+    predictions[:, 0] = lane_vehicles
+    for h in range(1, prediction_hours):
+        predictions[:, h] = np.maximum(0, predictions[:, h - 1] + variations[:, h - 1])
+    return predictions
+
+@st.cache_resource(max_entries=32)
+def build_base_map(center_lat, center_lon, zoom_level):
+    """
+    Build the junction base map: tiles and the centre marker.
+    
+    Cached on position and zoom only; lane markers are sent separately,
+    so signal changes don't rebuild or re-send the map itself.
+    
+    Args:
+        center_lat (float): Junction latitude
+        center_lon (float): Junction longitude
+        zoom_level (int): Initial zoom
+        
+    Returns:
+        folium.Map: The map
+    """
+    import folium
+    
+    # Create map
+    m = folium.Map(
+        location=[center_lat, center_lon],
+        zoom_start=zoom_level,
+        tiles="OpenStreetMap"
+    )
+    
+    # Center marker
+    folium.Marker(
+        location=[center_lat, center_lon],
+        popup="Traffic Junction",
+        tooltip="Main Junction",
+        icon=folium.Icon(color='blue', icon='info-sign')
+    ).add_to(m)
+    
+    return m
+
+@st.cache_resource(max_entries=64)
+def build_lane_markers(center_lat, center_lon, lane_state):
+    """
+    Build the lane signal markers as one feature group.
+    
+    Args:
+        center_lat (float): Junction latitude
+        center_lon (float): Junction longitude
+        lane_state (tuple): (lane, signal, signal_id, vehicles) per lane
+        
+    Returns:
+        folium.FeatureGroup: One circle marker per lane
+    """
+    import folium
+    
+    lanes_coords = {
+        'North': [center_lat + 0.003, center_lon],
+        'South': [center_lat - 0.003, center_lon],
+        'East': [center_lat, center_lon + 0.003],
+        'West': [center_lat, center_lon - 0.003]
+    }
+    
+    lane_markers = folium.FeatureGroup(name='Lanes')
+    for lane, sig, signal_id, veh in lane_state:
+        color = MAP_MARKER_COLORS[signal_id]
+        
+        lane_markers.add_child(folium.CircleMarker(
+            location=lanes_coords[lane],
+            radius=12,
+            popup=f"{lane}: {veh} vehicles<br>Signal: {sig}",
+            tooltip=f"{lane} ({veh} cars)",
+            color=color,
+            fill=True,
+            fillColor=color,
+            fillOpacity=0.8,
+            weight=2
+        ))
+    
+    return lane_markers
+
+@st.cache_data(max_entries=16)
+def lane_performance_df(lane_items):
+    """Lane performance table, one row per lane, from (lane, metrics) pairs."""
+    import pandas as pd
+    return pd.DataFrame.from_dict(dict(lane_items), orient='index')
+
+@st.cache_data(max_entries=4)
+def gzip_report(report):
+    """Gzip-compressed bytes of a JSON report, for download."""
+    return gzip.compress(report.encode('utf-8'))
+
+@st.cache_data(max_entries=64)
+def emergency_signal_grid_html(signal_fingerprint):
+    """
+    Emergency Mode signal cards as one CSS-grid HTML string.
+    
+    Args:
+        signal_fingerprint (tuple): (lane, signal, signal_id, vehicles, green_time) per lane
+        
+    Returns:
+        str: HTML for st.markdown
+    """
+    html_parts = [
+        SIGNAL_CARD_TEMPLATE.format_map({
+            'color': SIGNAL_COLORS[signal_id],
+            'emoji': SIGNAL_EMOJIS[signal_id],
+            'lane': lane,
+            'signal': signal,
+            'vehicles': vehicles,
+            'green_time': green_time
+        })
+        for lane, signal, signal_id, vehicles, green_time in signal_fingerprint
+    ]
+    return f'<div class="signal-grid">{"".join(html_parts)}</div>'
+
+@st.cache_resource(max_entries=64)
+def build_density_chart(lane_state):
+    """
+    Vehicle density bar chart, one bar per lane coloured by its signal.
+    
+    Cached on the lane state, so unchanged counts and signals reuse the
+    same Vega-Lite chart.
+    
+    Args:
+        lane_state (tuple): (lane, vehicles, signal) per lane
+        
+    Returns:
+        alt.Chart: The chart
+    """
+    import altair as alt
+    import pandas as pd
+    
+    density_df = pd.DataFrame(lane_state, columns=['Lane', 'Vehicles', 'Signal'])
+    return alt.Chart(density_df).mark_bar().encode(
+        x=alt.X('Lane:N', sort=list(density_df['Lane'])),
+        y='Vehicles:Q',
+        color=alt.Color('Signal:N', scale=alt.Scale(domain=list(SIGNALS), range=list(SIGNAL_COLORS)))
+    )
+
 # ============================================================================
 # HEADER
 # ============================================================================
@@ -193,19 +469,21 @@ if mode == "Single Junction":
         st.session_state.simulation_active = False
         st.rerun()
     
-    # Input sliders
-    lanes_input = {}
-    for lane in ['North', 'South', 'East', 'West']:
-        count = st.sidebar.slider(
-            f"🚗 {lane} Lane Vehicles",
-            min_value=0,
-            max_value=100,
-            value=controller.lanes[lane]['vehicles'],
-            step=5,
-            key=f"slider_{lane}"
-        )
-        lanes_input[lane] = count
-        multi_controller.set_vehicle_count(junction_id, lane, count)
+    # Input sliders, applied together on submit instead of rerunning per drag
+    with st.sidebar.form("lane_inputs"):
+        lanes_input = {
+            lane: st.slider(
+                f"🚗 {lane} Lane Vehicles",
+                min_value=0,
+                max_value=100,
+                value=controller.lanes[lane]['vehicles'],
+                step=5,
+                key=f"slider_{lane}"
+            )
+            for lane in ['North', 'South', 'East', 'West']
+        }
+        if st.form_submit_button("✅ Apply", use_container_width=True):
+            multi_controller.set_vehicle_counts(junction_id, lanes_input)
     
     # Control buttons
     st.sidebar.markdown("---")
@@ -219,107 +497,81 @@ if mode == "Single Junction":
         if st.button("⏹️ Stop", key="stop_btn", use_container_width=True):
             st.session_state.simulation_active = False
     
-    # Display current junction
-    st.markdown(f"### 🏢 {multi_controller.junctions[0]['name']} Intersection")
-    
-    signal_state = controller.get_signal_state()
-    stats = controller.get_statistics()
-    
-    # Signal display grid
-    cols = st.columns(2)
-    color_mapping = {'RED': '#ff6b6b', 'GREEN': '#51cf66', 'YELLOW': '#ffd43b'}
-    signal_emojis = {'RED': '🔴', 'GREEN': '🟢', 'YELLOW': '🟡'}
-    
-    for idx, (lane, state) in enumerate(signal_state.items()):
-        with cols[idx % 2]:
-            signal_color = color_mapping[state['signal']]
-            signal_emoji = signal_emojis[state['signal']]
-            
-            st.markdown(f"""
-            <div style="background-color: {signal_color}; padding: 20px; border-radius: 10px; 
-                        text-align: center; color: white; margin: 10px 0;">
-                <h3 style="margin: 0; color: white;">{signal_emoji} {lane}</h3>
-                <p style="margin: 5px 0; font-size: 18px; font-weight: bold;">
-                    Signal: <span style="text-transform: uppercase;">{state['signal']}</span>
-                </p>
-                <p style="margin: 5px 0; font-size: 16px;">
-                    🚗 Vehicles: {state['vehicles']}
-                </p>
-                <p style="margin: 5px 0; font-size: 16px;">
-                    ⏱️ Green Time: {state['green_time']}s
-                </p>
-                <p style="margin: 5px 0; font-size: 14px;">
-                    Congestion: <strong>{state['congestion']}</strong>
-                </p>
-            </div>
-            """, unsafe_allow_html=True)
-    
-    # Statistics
-    st.markdown("---")
-    st.markdown("### 📈 Traffic Statistics")
-    
-    stat_cols = st.columns(4)
-    with stat_cols[0]:
-        st.metric("Total Vehicles", stats['total_vehicles'])
-    with stat_cols[1]:
-        st.metric("Avg per Lane", f"{stats['average_vehicles_per_lane']:.1f}")
-    with stat_cols[2]:
-        st.metric("Most Congested", stats['most_congested_lane'])
-    with stat_cols[3]:
-        st.metric("Cycle", stats['cycle_number'])
-    
-    # Charts
-    st.markdown("---")
-    st.markdown("### 📊 Vehicle Density Chart")
-    
-    fig, ax = plt.subplots(figsize=(12, 5))
-    lanes = list(signal_state.keys())
-    vehicles = [signal_state[lane]['vehicles'] for lane in lanes]
-    colors_bars = [color_mapping[signal_state[lane]['signal']] for lane in lanes]
-    
-    bars = ax.bar(lanes, vehicles, color=colors_bars, alpha=0.8, edgecolor='black', linewidth=2)
-    
-    for bar, vehicle_count in zip(bars, vehicles):
-        height = bar.get_height()
-        ax.text(bar.get_x() + bar.get_width()/2., height,
-                f'{int(vehicle_count)}',
-                ha='center', va='bottom', fontsize=11, fontweight='bold')
+    def single_junction_panel():
+        """Signal grid, statistics and chart; refreshed every simulation step."""
+        import pandas as pd
+        
+        stepped = simulation_step_due("sim_last_step")
+        if stepped:
+            multi_controller.advance_signal(junction_id)
+        
+        # Junction state computed once per run, shared by sync and display
+        signal_state = controller.get_signal_state()
+        stats = controller.get_statistics()
+        if stepped:
+            st.session_state.last_sync_ok = sync_junction_to_firebase(junction_id, signal_state, stats)
+        
+        # Display current junction
+        st.markdown(f"### 🏢 {multi_controller.junctions[0]['name']} Intersection")
     
-    ax.set_ylabel('Number of Vehicles', fontsize=12, fontweight='bold')
-    ax.set_xlabel('Lane Direction', fontsize=12, fontweight='bold')
-    ax.set_title('Current Traffic Density Across All Lanes', fontsize=14, fontweight='bold')
-    ax.grid(axis='y', alpha=0.3, linestyle='--')
+        # Signal display grid: one styled table, rows coloured by signal
+        signal_df = pd.DataFrame(
+            [
+                {
+                    'Lane': f"{SIGNAL_EMOJIS[state['signal_id']]} {lane}",
+                    'Signal': state['signal'],
+                    'Vehicles': state['vehicles'],
+                    'Green Time (s)': state['green_time'],
+                    'Congestion': state['congestion']
+                }
+                for lane, state in signal_state.items()
+            ]
+        ).set_index('Lane')
+        row_styles = {
+            label: f"background-color: {SIGNAL_COLORS[state['signal_id']]}; color: white; font-weight: bold"
+            for label, state in zip(signal_df.index, signal_state.values())
+        }
     
-    st.pyplot(fig, use_container_width=True)
+        styled = signal_df.style.apply(lambda row: [row_styles[row.name]] * len(row), axis=1)
+        st.dataframe(styled, use_container_width=True)
     
-    # Simulation loop
-    if st.session_state.simulation_active:
-        status_placeholder = st.empty()
-        progress_placeholder = st.empty()
-        sync_status = st.empty()
+        # Statistics
+        st.markdown("---")
+        st.markdown("### 📈 Traffic Statistics")
+    
+        stat_cols = st.columns(4)
+        with stat_cols[0]:
+            st.metric("Total Vehicles", stats['total_vehicles'])
+        with stat_cols[1]:
+            st.metric("Avg per Lane", f"{stats['average_vehicles_per_lane']:.1f}")
+        with stat_cols[2]:
+            st.metric("Most Congested", stats['most_congested_lane'])
+        with stat_cols[3]:
+            st.metric("Cycle", stats['cycle_number'])
+    
+        # Charts
+        st.markdown("---")
+        st.markdown("### 📊 Vehicle Density Chart")
+    
+        # Bars coloured by each lane's current signal, rendered client-side
+        density_chart = build_density_chart(tuple(
+            (lane, state['vehicles'], state['signal']) for lane, state in signal_state.items()
+        ))
+        st.altair_chart(density_chart, use_container_width=True)
+    
+        # Simulation status
+        if st.session_state.simulation_active:
+            st.info(f"""
+            **Simulation Active** | Cycle: {stats['cycle_number']} | 
+            Green Lane: {stats['current_green_lane']}
+            """)
         
-        for i in range(5):
-            if st.session_state.simulation_active:
-                progress_placeholder.progress((i + 1) / 5)
-                
-                with status_placeholder.container():
-                    st.info(f"""
-                    **Simulation Active** | Cycle: {controller.get_statistics()['cycle_number']} | 
-                    Green Lane: {controller.get_statistics()['current_green_lane']}
-                    """)
-                
-                # AUTO-SYNC TO FIREBASE
-                sync_success = sync_junction_to_firebase(junction_id)
-                with sync_status.container():
-                    if sync_success:
-                        st.success("🔄 Synced to Firebase ✓")
-                    else:
-                        st.info("💾 Running locally (Firebase optional)")
-                
-                import time
-                time.sleep(3)
-                multi_controller.advance_signal(junction_id)
-                st.rerun()
+            if st.session_state.get('last_sync_ok'):
+                st.success("🔄 Synced to Firebase ✓")
+            else:
+                st.info("💾 Running locally (Firebase optional)")
+    
+    run_live_panel(single_junction_panel)
 
 # ============================================================================
 # MODE 2: MULTI-JUNCTION CONTROL
@@ -336,8 +588,14 @@ elif mode == "Multi-Junction":
     )
     
     if num_junctions != multi_controller.num_junctions:
-        multi_controller = MultiJunctionController(num_junctions)
-        st.session_state.multi_controller = multi_controller
+        # Grow/shrink in place so existing junctions keep their state
+        multi_controller.resize(num_junctions)
+        for junc_id, junction in multi_controller.junctions.items():
+            if junc_id not in emergency_controllers:
+                emergency_controllers[junc_id] = EmergencyController(junction['controller'])
+        for junc_id in list(emergency_controllers):
+            if junc_id not in multi_controller.junctions:
+                del emergency_controllers[junc_id]
         st.rerun()
     
     # Coordination mode
@@ -349,34 +607,43 @@ elif mode == "Multi-Junction":
     
     st.sidebar.markdown("---")
     
-    # Junction selector
-    junction_id = st.sidebar.selectbox(
-        "Select Junction to Control:",
-        options=list(range(num_junctions)),
-        format_func=lambda x: f"{multi_controller.junctions[x]['name']} (Junction {x})"
-    )
-    
-    # Input sliders for selected junction
-    st.sidebar.markdown("### 📊 Vehicle Input")
-    
     # Handle Reset Button BEFORE rendering sliders
     if st.sidebar.button("🔄 Reset All", key="reset_multi", use_container_width=True):
         multi_controller.reset_all()
         st.session_state.simulation_active = False
         st.rerun()
     
-    controller = multi_controller.junctions[junction_id]['controller']
-    
-    for lane in ['North', 'South', 'East', 'West']:
-        count = st.sidebar.slider(
-            f"{lane}",
-            min_value=0,
-            max_value=100,
-            value=controller.lanes[lane]['vehicles'],
-            step=5,
-            key=f"multi_slider_{junction_id}_{lane}"
+    def junction_input_panel():
+        """Junction selector and lane sliders; switching junction reruns only this panel."""
+        junction_id = st.selectbox(
+            "Select Junction to Control:",
+            options=list(range(num_junctions)),
+            format_func=lambda x: f"{multi_controller.junctions[x]['name']} (Junction {x})"
         )
-        multi_controller.set_vehicle_count(junction_id, lane, count)
+        
+        # Input sliders for selected junction
+        st.markdown("### 📊 Vehicle Input")
+        
+        controller = multi_controller.junctions[junction_id]['controller']
+        
+        with st.form(f"multi_lane_inputs_{junction_id}"):
+            lanes_input = {
+                lane: st.slider(
+                    f"{lane}",
+                    min_value=0,
+                    max_value=100,
+                    value=controller.lanes[lane]['vehicles'],
+                    step=5,
+                    key=f"multi_slider_{junction_id}_{lane}"
+                )
+                for lane in ['North', 'South', 'East', 'West']
+            }
+            if st.form_submit_button("✅ Apply", use_container_width=True):
+                if multi_controller.set_vehicle_counts(junction_id, lanes_input):
+                    st.rerun()  # Refresh the network panel too
+    
+    with st.sidebar:
+        st.fragment(junction_input_panel)()
     
     # Control buttons
     st.sidebar.markdown("---")
@@ -388,97 +655,84 @@ elif mode == "Multi-Junction":
         if st.button("⏹️ Stop All", key="stop_multi", use_container_width=True):
             st.session_state.simulation_active = False
     
-    # Display all junctions
-    st.markdown("### 🏙️ Multi-Junction Traffic Network")
+    def junction_network_panel():
+        """Junction grid, health and recommendations; refreshed every simulation step."""
+        # Advance ALL junctions once per simulation step
+        stepped = simulation_step_due("multi_last_step")
+        if stepped:
+            multi_controller.advance_signal()
+        
+        # State assembled once per run, shared by sync and every panel below
+        all_state = multi_controller.get_all_junctions_state()
+        if stepped:
+            for junc_id, junc_state in all_state.items():
+                sync_junction_to_firebase(  # Auto-sync each junction
+                    junc_id, junc_state['signal_state'], junc_state['statistics']
+                )
+        
+        # Display all junctions
+        st.markdown("### 🏙️ Multi-Junction Traffic Network")
     
-    health = multi_controller.get_system_health()
+        health = multi_controller.get_system_health(all_state)
     
-    # System health metrics
-    col1, col2, col3, col4 = st.columns(4)
-    with col1:
-        st.metric("Total Vehicles", health['total_vehicles'])
-    with col2:
-        st.metric("System Efficiency", f"{health['system_efficiency']:.1f}%")
-    with col3:
-        st.metric("Mode", health['coordination_mode'].capitalize())
-    with col4:
-        st.metric("Active Junctions", health['active_junctions'])
+        # System health metrics
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Total Vehicles", health['total_vehicles'])
+        with col2:
+            st.metric("System Efficiency", f"{health['system_efficiency']:.1f}%")
+        with col3:
+            st.metric("Mode", health['coordination_mode'].capitalize())
+        with col4:
+            st.metric("Active Junctions", health['active_junctions'])
     
-    st.markdown("---")
+        st.markdown("---")
     
-    # Display each junction
-    all_state = multi_controller.get_all_junctions_state()
+        # Display every junction as one HTML element: a row per junction
+        # with its counters and mini signal cards
+        junction_rows = []
+        for junc_state in all_state.values():
+            mini_cards = "".join(
+                MINI_CARD_TEMPLATE.format_map({
+                    'color': SIGNAL_COLORS[state['signal_id']],
+                    'emoji': SIGNAL_EMOJIS[state['signal_id']],
+                    'lane': lane,
+                    'vehicles': state['vehicles'],
+                    'green_time': state['green_time']
+                })
+                for lane, state in junc_state['signal_state'].items()
+            )
+            junction_rows.append(JUNCTION_ROW_TEMPLATE.format_map({
+                'name': junc_state['name'],
+                'vehicles': junc_state['total_vehicles'],
+                'cycle': junc_state['statistics']['cycle_number'],
+                'mini_cards': mini_cards
+            }))
+        st.markdown("".join(junction_rows), unsafe_allow_html=True)
+    
+        # SIMULATION STATUS FOR MULTI-JUNCTION
+        if st.session_state.simulation_active:
+            st.info(f"""
+            **Simulation Active** | Coordinated Mode | 
+            Total Vehicles: {health['total_vehicles']}
+            """)
     
-    for junc_id, junc_state in all_state.items():
-        col1, col2 = st.columns([1, 3])
-        
-        with col1:
-            st.markdown(f"### {junc_state['name']}")
-            st.metric("Vehicles", junc_state['total_vehicles'])
-            st.metric("Cycle", junc_state['statistics']['cycle_number'])
-        
-        with col2:
-            # Mini signal display with colors
-            signal_state = junc_state['signal_state']
-            mini_cols = st.columns(4)
-            
-            # Color mapping
-            color_mapping = {'RED': '#ff6b6b', 'GREEN': '#51cf66', 'YELLOW': '#ffd43b'}
-            signal_emoji = {'RED': '🔴', 'GREEN': '🟢', 'YELLOW': '🟡'}
-            
-            for idx, (lane, state) in enumerate(signal_state.items()):
-                with mini_cols[idx]:
-                    signal_color = color_mapping[state['signal']]
-                    signal_icon = signal_emoji[state['signal']]
-                    
-                    st.markdown(f"""
-                    <div style="background-color: {signal_color}; padding: 15px; border-radius: 8px; 
-                                text-align: center; color: white; margin: 5px 0;">
-                        <h4 style="margin: 0; color: white;">{signal_icon} {lane}</h4>
-                        <p style="margin: 3px 0; font-size: 12px;">{state['vehicles']} vehicles</p>
-                        <p style="margin: 3px 0; font-size: 11px;">{state['green_time']}s green</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-    
-    # SIMULATION LOOP FOR MULTI-JUNCTION
-    if st.session_state.simulation_active:
-        status_placeholder = st.empty()
-        progress_placeholder = st.empty()
-        
-        for i in range(5):
-            if st.session_state.simulation_active:
-                progress_placeholder.progress((i + 1) / 5)
-                
-                with status_placeholder.container():
-                    st.info(f"""
-                    **Simulation Active** | Coordinated Mode | 
-                    Total Vehicles: {multi_controller.get_system_health()['total_vehicles']}
-                    """)
-                
-                import time
-                time.sleep(3)
-                
-                # Advance ALL junctions
-                for junc_id in range(multi_controller.num_junctions):
-                    multi_controller.advance_signal(junc_id)
-                    sync_junction_to_firebase(junc_id)  # Auto-sync each junction
-                
-                st.rerun()
+        # Recommendations
+        st.markdown("---")
+        st.markdown("### 💡 Optimization Recommendations")
     
-    # Recommendations
-    st.markdown("---")
-    st.markdown("### 💡 Optimization Recommendations")
+        recommendations = multi_controller.get_coordination_recommendations(all_state)
     
-    recommendations = multi_controller.get_coordination_recommendations()
+        if recommendations:
+            for rec in recommendations:
+                if rec['severity'] == 'high':
+                    st.error(f"⚠️ {rec['message']}")
+                else:
+                    st.info(f"ℹ️ {rec['message']}")
+        else:
+            st.success("✅ All junctions operating normally!")
     
-    if recommendations:
-        for rec in recommendations:
-            if rec['severity'] == 'high':
-                st.error(f"⚠️ {rec['message']}")
-            else:
-                st.info(f"ℹ️ {rec['message']}")
-    else:
-        st.success("✅ All junctions operating normally!")
+    run_live_panel(junction_network_panel)
 
 # ============================================================================
 # MODE 3: EMERGENCY MODE
@@ -542,24 +796,13 @@ elif mode == "Emergency Mode":
     controller = multi_controller.junctions[junction_id]['controller']
     signal_state = controller.get_signal_state()
     
-    cols = st.columns(2)
-    color_mapping = {'RED': '#ff6b6b', 'GREEN': '#51cf66', 'YELLOW': '#ffd43b'}
-    signal_emojis = {'RED': '🔴', 'GREEN': '🟢', 'YELLOW': '🟡'}
-    
-    for idx, (lane, state) in enumerate(signal_state.items()):
-        with cols[idx % 2]:
-            signal_color = color_mapping[state['signal']]
-            signal_emoji = signal_emojis[state['signal']]
-            
-            st.markdown(f"""
-            <div style="background-color: {signal_color}; padding: 20px; border-radius: 10px; 
-                        text-align: center; color: white; margin: 10px 0;">
-                <h3 style="margin: 0; color: white;">{signal_emoji} {lane}</h3>
-                <p>Signal: <strong>{state['signal']}</strong></p>
-                <p>Vehicles: {state['vehicles']}</p>
-                <p>Green Time: {state['green_time']}s</p>
-            </div>
-            """, unsafe_allow_html=True)
+    # All four cards in one CSS grid, sent as a single element; the HTML is
+    # only rebuilt when a lane's signal, count or green time changes
+    signal_fingerprint = tuple(
+        (lane, state['signal'], state['signal_id'], state['vehicles'], state['green_time'])
+        for lane, state in signal_state.items()
+    )
+    st.markdown(emergency_signal_grid_html(signal_fingerprint), unsafe_allow_html=True)
 
 # ============================================================================
 # MODE 4: ANALYTICS DASHBOARD
@@ -567,16 +810,25 @@ elif mode == "Emergency Mode":
 elif mode == "Analytics Dashboard":
     st.markdown("### 📊 Traffic Analytics & Performance")
     
-    # Update analytics with current system state
-    timestamp = datetime.now().isoformat()
-    for junc_id in range(multi_controller.num_junctions):
-        junc_state = multi_controller.get_all_junctions_state()[junc_id]
-        analytics.log_snapshot(
-            timestamp,
-            junc_id,
-            junc_state['signal_state'],
-            junc_state['statistics']
-        )
+    import pandas as pd
+    
+    # Update analytics with current system state (at most once a second,
+    # and only for junctions whose signals or counts changed since their
+    # last snapshot, so idle reruns don't flood the log)
+    now = time.monotonic()
+    if now - st.session_state.get('last_snapshot', float('-inf')) > 1.0:
+        last_hashes = st.session_state.setdefault('last_snapshot_hash', {})
+        changed_states = {}
+        for junc_id, junc_state in multi_controller.get_all_junctions_state().items():
+            state_hash = hash(tuple(
+                (lane, state['signal'], state['vehicles'])
+                for lane, state in junc_state['signal_state'].items()
+            ))
+            if last_hashes.get(junc_id) != state_hash:
+                changed_states[junc_id] = junc_state
+                last_hashes[junc_id] = state_hash
+        analytics.log_batch(time.time(), changed_states)
+        st.session_state.last_snapshot = now
     
     # Get analytics data
     efficiency = analytics.get_system_efficiency()
@@ -604,11 +856,19 @@ elif mode == "Analytics Dashboard":
     with col2:
         st.metric("Change", f"{trend['change_percent']:.1f}%")
     
+    # Downsampled in TrafficAnalytics, so the chart never exceeds 2000 points
+    history_ts, history_congestion = analytics.get_congestion_history()
+    if len(history_ts) > 1:
+        st.line_chart(pd.DataFrame(
+            {'Congestion (%)': history_congestion},
+            index=pd.to_datetime(history_ts, unit='ms')
+        ))
+    
     st.markdown("---")
     st.markdown("### 🎯 Lane Performance Analysis")
     
     if lane_perf:
-        df = pd.DataFrame(lane_perf).T
+        df = lane_performance_df(tuple(lane_perf.items()))
         st.dataframe(df, use_container_width=True)
     
     st.markdown("---")
@@ -618,19 +878,23 @@ elif mode == "Analytics Dashboard":
         report = analytics.export_analytics_report()
         st.download_button(
             label="Download JSON Report",
-            data=report,
-            file_name=f"traffic_analytics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-            mime="application/json"
+            data=gzip_report(report),
+            file_name=f"traffic_analytics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json.gz",
+            mime="application/gzip"
         )
     
     if st.button("Clear Analytics"):
         # Clear all analytics logs
         analytics.clear_logs()
+        # Log afresh on the next rerun
+        st.session_state.pop('last_snapshot', None)
+        st.session_state.pop('last_snapshot_hash', None)
         
         # Also reset all junctions to clear current traffic state
         for junction_id in range(multi_controller.num_junctions):
-            for lane in ['North', 'South', 'East', 'West']:
-                multi_controller.set_vehicle_count(junction_id, lane, 0)
+            multi_controller.set_vehicle_counts(
+                junction_id, dict.fromkeys(['North', 'South', 'East', 'West'], 0)
+            )
         
         st.session_state.simulation_active = False
         st.success("Analytics cleared!")
@@ -643,6 +907,8 @@ elif mode == "Historical Data":
     st.markdown("## 📚 Historical Traffic Data & Storage")
     st.markdown("Store, analyze, and learn from past traffic patterns for predictive control")
     
+    import pandas as pd
+    
     # Tabs for different views
     tab1, tab2, tab3, tab4, tab5 = st.tabs([
         "📊 Data Storage", 
@@ -715,6 +981,9 @@ elif mode == "Historical Data":
                             st.error(f"Error saving Junction {junc_id}: {str(e)}")
                             all_saved = False
                     
+                    # Write the batch to disk before reporting it saved
+                    historical_manager.flush()
+                    
                     if all_saved and saved_count > 0:
                         st.success(f"✅ Successfully saved {saved_count} junction(s) to history!")
                         st.info("Go to 'Historical Analysis' tab to see your stored data")
@@ -816,6 +1085,7 @@ elif mode == "Historical Data":
             avg_vehicles = [peak_hours[h]['average_vehicles'] for h in hours]
             peak_vehicles = [peak_hours[h]['peak_vehicles'] for h in hours]
             
+            plt = get_pyplot()
             fig, ax = plt.subplots(figsize=(14, 5))
             
             ax.bar([h - 0.2 for h in hours], avg_vehicles, width=0.4, label='Average', alpha=0.8, color='#4472C4')
@@ -829,6 +1099,7 @@ elif mode == "Historical Data":
             ax.set_xticks(range(0, 24))
             
             st.pyplot(fig, use_container_width=True)
+            plt.close(fig)
             
             # Table of peak hours
             st.markdown("**Peak Hours Summary:**")
@@ -965,6 +1236,8 @@ elif mode == "Predictive Analytics":
     st.markdown("## Predictive Analytics - AI-Based Traffic Forecasting")
     st.markdown("Machine Learning models predict future traffic patterns")
     
+    import pandas as pd
+    
     st.markdown("---")
     
     # Sidebar settings
@@ -1016,25 +1289,20 @@ elif mode == "Predictive Analytics":
         st.markdown("---")
         st.markdown("### Predicted Trends")
         
-        # Simple chart
-        fig, ax = plt.subplots(figsize=(12, 5))
-        hours = list(range(prediction_hours))
-        
-        np.random.seed(42)
-        for idx, lane in enumerate(lanes):
-            current = lane_vehicles[idx]
-            predictions = [current]
-            for h in range(1, prediction_hours):
-                variation = np.random.normal(0, 3)
-                predictions.append(max(0, predictions[-1] + variation))
-            ax.plot(hours, predictions, marker='o', label=lane, linewidth=2)
-        
-        ax.set_xlabel('Hours', fontsize=11)
-        ax.set_ylabel('Vehicles', fontsize=11)
-        ax.set_title('Traffic Forecast', fontsize=12, fontweight='bold')
-        ax.legend()
-        ax.grid(True, alpha=0.3)
-        st.pyplot(fig, use_container_width=True)
+        # 2x2 forecast grid, rendered in the browser
+        import altair as alt
+        predictions = forecast_series(tuple(lane_vehicles), prediction_hours)
+        forecast_df = pd.DataFrame({
+            'Lane': np.repeat(lanes, prediction_hours),
+            'Hours': np.tile(np.arange(prediction_hours), len(lanes)),
+            'Vehicles': predictions.ravel()
+        })
+        forecast_chart = alt.Chart(forecast_df).mark_line(point=True).encode(
+            x='Hours:Q', y='Vehicles:Q'
+        ).properties(
+            width=300, height=200
+        ).facet(facet=alt.Facet('Lane:N', sort=lanes), columns=2)
+        st.altair_chart(forecast_chart)
         
         st.markdown("---")
         st.markdown("### Summary Table")
@@ -1067,57 +1335,28 @@ elif mode == "Maps View":
     center_lon = st.sidebar.slider("Longitude", -180.0, 180.0, -74.0060, 0.0001)
     zoom_level = st.sidebar.slider("Zoom Level", 10, 20, 15)
     
-    # Create map
-    m = folium.Map(
-        location=[center_lat, center_lon],
-        zoom_start=zoom_level,
-        tiles="OpenStreetMap"
-    )
+    from streamlit_folium import st_folium
     
     # Get controller
     controller = multi_controller.junctions[0]['controller']
     signal_state = controller.get_signal_state()
     
-    # Add lane markers
-    lanes_coords = {
-        'North': [center_lat + 0.003, center_lon],
-        'South': [center_lat - 0.003, center_lon],
-        'East': [center_lat, center_lon + 0.003],
-        'West': [center_lat, center_lon - 0.003]
-    }
-    
-    signal_colors = {
-        'GREEN': 'green',
-        'RED': 'red',
-        'YELLOW': 'orange'
-    }
-    
-    for lane, coords in lanes_coords.items():
-        sig = signal_state[lane]['signal']
-        veh = signal_state[lane]['vehicles']
-        color = signal_colors.get(sig, 'gray')
-        
-        folium.CircleMarker(
-            location=coords,
-            radius=12,
-            popup=f"{lane}: {veh} vehicles<br>Signal: {sig}",
-            tooltip=f"{lane} ({veh} cars)",
-            color=color,
-            fill=True,
-            fillColor=color,
-            fillOpacity=0.8,
-            weight=2
-        ).add_to(m)
-    
-    # Center marker
-    folium.Marker(
-        location=[center_lat, center_lon],
-        popup="Traffic Junction",
-        tooltip="Main Junction",
-        icon=folium.Icon(color='blue', icon='info-sign')
-    ).add_to(m)
-    
-    st_folium(m, width=1200, height=600)
+    lane_state = tuple(
+        (lane, state['signal'], state['signal_id'], state['vehicles'])
+        for lane, state in signal_state.items()
+    )
+    # Lane markers go in as a feature group, so signal changes update the
+    # markers in place instead of re-rendering the whole map. Nothing reads
+    # the map's interactions back, so none are returned and panning or
+    # zooming doesn't trigger a rerun.
+    st_folium(
+        build_base_map(center_lat, center_lon, zoom_level),
+        feature_group_to_add=build_lane_markers(center_lat, center_lon, lane_state),
+        key="junction_map",
+        width=1200,
+        height=600,
+        returned_objects=[]
+    )
     
     st.markdown("---")
     st.markdown("### Signal Status")
@@ -1140,6 +1379,8 @@ elif mode == "Cloud Sync":
     st.markdown("## Cloud Sync - Firebase Real-time Data Synchronization")
     st.markdown("Store and sync traffic data across multiple cities in cloud")
     
+    import pandas as pd
+    
     # Initialize cloud sync state
     if 'cloud_sync_enabled' not in st.session_state:
         st.session_state.cloud_sync_enabled = False
@@ -1250,10 +1491,11 @@ elif mode == "Cloud Sync":
             st.metric("Synced Records", f"{st.session_state.synced_data_count:,}")
             st.metric("Cloud Storage", f"{st.session_state.cloud_storage_mb} MB")
             
-            # Show live junction data being synced
+            # Show live junction data being synced; one set of columns,
+            # each junction's metrics stacked in the same row order
             st.markdown("#### Live Junction Data")
+            col_a, col_b, col_c = st.columns(3)
             for jdata in all_junctions_data:
-                col_a, col_b, col_c = st.columns(3)
                 with col_a:
                     st.metric(f"Junction {jdata['junction_id']}", f"{jdata['vehicles']} vehicles")
                 with col_b:
@@ -1376,6 +1618,8 @@ elif mode == "Computer Vision":
     st.markdown("## Computer Vision - AI-Powered Vehicle Detection")
     st.markdown("Automatic vehicle detection from camera feeds using AI")
     
+    import pandas as pd
+    
     st.info("""
     Computer Vision Features:
     - Real-time vehicle detection from camera feed
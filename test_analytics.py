@@ -0,0 +1,105 @@
+"""
+Tests for the TrafficAnalytics log store
+"""
+
+import os
+import time
+
+import numpy as np
+
+from analytics import TrafficAnalytics, LANES
+
+
+def make_state(vehicles, cycle, green_lane='North'):
+    """One junction's state as returned by get_all_junctions_state()"""
+    return {
+        'signal_state': {
+            lane: {'signal': 'GREEN' if lane == green_lane else 'RED', 'vehicles': vehicles + j}
+            for j, lane in enumerate(LANES)
+        },
+        'statistics': {'total_vehicles': 4 * vehicles + 6, 'cycle_number': cycle}
+    }
+
+
+def test_snapshot_with_missing_lanes():
+    signal_state = {'North': {'signal': 'GREEN', 'vehicles': 12}}
+    statistics = {'total_vehicles': 12, 'cycle_number': 1}
+    analytics = TrafficAnalytics()
+    analytics.log_snapshot(1700000000.0, 0, signal_state, statistics)
+    batch = TrafficAnalytics()
+    batch.log_batch(1700000000.0, {0: {'signal_state': signal_state, 'statistics': statistics}})
+    
+    lanes = analytics.get_lane_performance()
+    assert batch.get_lane_performance() == lanes
+    assert lanes['North'] == {'total_vehicles': 12, 'times_green': 1, 'average_wait': 0, 'throughput': 12}
+    for lane in ('South', 'East', 'West'):
+        assert lanes[lane]['total_vehicles'] == 0
+        assert lanes[lane]['times_green'] == 0
+
+
+def test_batch_matches_snapshots_after_wrap():
+    by_snapshot = TrafficAnalytics(max_logs=5)
+    by_batch = TrafficAnalytics(max_logs=5)
+    
+    # 4 batches of 3 junctions overwrite the 5-row buffer more than twice
+    for step in range(4):
+        timestamp = 1700000000.0 + 1800 * step
+        states = {
+            junction: make_state(10 * step + junction, step, LANES[(step + junction) % len(LANES)])
+            for junction in range(3)
+        }
+        by_batch.log_batch(timestamp, states)
+        for junction, state in states.items():
+            by_snapshot.log_snapshot(timestamp, junction, state['signal_state'], state['statistics'])
+    
+    for analytics in (by_snapshot, by_batch):
+        assert analytics._size == 5
+    assert by_batch.get_system_efficiency() == by_snapshot.get_system_efficiency()
+    assert by_batch.get_lane_performance() == by_snapshot.get_lane_performance()
+    assert by_batch.get_peak_hours() == by_snapshot.get_peak_hours()
+    assert by_batch.get_average_wait_time(1) == by_snapshot.get_average_wait_time(1)
+    for expected, actual in zip(by_snapshot.get_congestion_history(), by_batch.get_congestion_history()):
+        np.testing.assert_array_equal(actual, expected)
+    np.testing.assert_array_equal(by_batch.hourly_counts, by_snapshot.hourly_counts)
+    np.testing.assert_array_equal(by_batch.hourly_throughput, by_snapshot.hourly_throughput)
+
+
+def test_hours_follow_daylight_saving():
+    if not hasattr(time, 'tzset'):
+        return
+    
+    saved_tz = os.environ.get('TZ')
+    os.environ['TZ'] = 'America/New_York'
+    time.tzset()
+    try:
+        analytics = TrafficAnalytics()
+        # Noon local time in winter (EST) and in summer (EDT)
+        for timestamp in (1705338000.0, 1721059200.0):
+            analytics.log_batch(timestamp, {0: make_state(10, 1)})
+        assert analytics.hourly_counts.sum(axis=1)[12] == 2
+    finally:
+        if saved_tz is None:
+            del os.environ['TZ']
+        else:
+            os.environ['TZ'] = saved_tz
+        time.tzset()
+
+
+def test_cached_results_are_copies():
+    analytics = TrafficAnalytics()
+    analytics.log_batch(1700000000.0, {0: make_state(10, 1)})
+    
+    lanes = analytics.get_lane_performance()
+    lanes['North']['total_vehicles'] = -1
+    lanes.clear()
+    analytics.get_peak_hours().append(99)
+    
+    assert analytics.get_lane_performance()['North']['total_vehicles'] == 10
+    assert 99 not in analytics.get_peak_hours()
+
+
+if __name__ == "__main__":
+    test_snapshot_with_missing_lanes()
+    test_batch_matches_snapshots_after_wrap()
+    test_hours_follow_daylight_saving()
+    test_cached_results_are_copies()
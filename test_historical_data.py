@@ -139,5 +139,154 @@ def test_historical_data():
     print("✅ ALL TESTS PASSED - HISTORICAL DATA SYSTEM WORKING!")
     print("="*60 + "\n")
 
+def test_index_follows_disk():
+    import shutil
+    import tempfile
+    from pathlib import Path
+    
+    local_dir = tempfile.mkdtemp()
+    try:
+        manager = HistoricalDataManager(local_dir=local_dir)
+        today = datetime.now().date()
+        for vehicles in (10, 20):
+            manager.save_snapshot({'junction_id': 0, 'statistics': {'total_vehicles': vehicles}})
+        assert len(manager.get_data_by_date(today)) == 2
+        
+        # A day directory deleted by hand is skipped, not a crash
+        shutil.rmtree(Path(local_dir) / str(today))
+        assert manager.get_data_by_date(today) == []
+        assert manager.get_statistics_summary(days=3) == {'status': 'No data available'}
+        
+        # Data copied into an existing store is indexed when it is reopened
+        copied = Path(local_dir) / '2024-01-15' / 'junction_3' / 'data.jsonl'
+        copied.parent.mkdir(parents=True)
+        copied.write_text(json.dumps({
+            'timestamp': '2024-01-15T08:30:00', 'junction_id': 3,
+            'statistics': {'total_vehicles': 7}, 'congestion_level': 10.5
+        }) + '\n')
+        assert HistoricalDataManager(local_dir=local_dir).get_data_by_date('2024-01-15', 3)[0]['junction_id'] == 3
+    finally:
+        shutil.rmtree(local_dir)
+
+def test_stale_metrics_rebuilt():
+    import shutil
+    import tempfile
+    import historical_data
+    
+    if not historical_data.PYARROW_AVAILABLE:
+        return
+    
+    local_dir = tempfile.mkdtemp()
+    write_table = historical_data.pq.write_table
+    timestamp = datetime.now().replace(hour=9).isoformat()
+    try:
+        manager = HistoricalDataManager(local_dir=local_dir)
+        manager.save_snapshot({'timestamp': timestamp, 'junction_id': 0, 'statistics': {'total_vehicles': 10}})
+        manager.flush()
+        
+        def failing_write_table(*args, **kwargs):
+            raise OSError('disk full')
+        
+        # A failed metrics.parquet update must not hide snapshots for good
+        historical_data.pq.write_table = failing_write_table
+        manager.save_snapshot({'timestamp': timestamp, 'junction_id': 0, 'statistics': {'total_vehicles': 20}})
+        manager.flush()
+        historical_data.pq.write_table = write_table
+        manager.save_snapshot({'timestamp': timestamp, 'junction_id': 0, 'statistics': {'total_vehicles': 30}})
+        
+        summary = manager.get_statistics_summary(days=1)
+        assert summary['total_snapshots'] == 3
+        assert summary['total_vehicles'] == 60
+        assert len(manager.get_data_by_hour(9)) == 3
+    finally:
+        historical_data.pq.write_table = write_table
+        shutil.rmtree(local_dir)
+
+def test_buffered_saves():
+    import gc
+    import shutil
+    import tempfile
+    import threading
+    import time
+    import weakref
+    from pathlib import Path
+    import historical_data
+    
+    local_dir = tempfile.mkdtemp()
+    try:
+        manager = HistoricalDataManager(local_dir=local_dir)
+        today = datetime.now().date()
+        data_file = Path(local_dir) / str(today) / 'junction_0' / 'data.jsonl'
+        
+        # Saves are buffered until a flush...
+        manager.save_snapshot({'junction_id': 0, 'statistics': {'total_vehicles': 1}})
+        assert not data_file.exists()
+        manager.flush()
+        assert data_file.exists()
+        
+        # ...but reads always see them, including saves from other threads
+        def save_many():
+            for vehicles in range(50):
+                manager.save_snapshot({'junction_id': 0, 'statistics': {'total_vehicles': vehicles}})
+        threads = [threading.Thread(target=save_many) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(manager.get_data_by_date(today)) == 201
+        
+        # The size bound and the time bound both write without a read
+        manager.FLUSH_BYTES = 1
+        manager.save_snapshot({'junction_id': 1, 'statistics': {'total_vehicles': 1}})
+        assert (Path(local_dir) / str(today) / 'junction_1' / 'data.jsonl').exists()
+        manager.FLUSH_BYTES = HistoricalDataManager.FLUSH_BYTES
+        manager.FLUSH_INTERVAL = 0.05
+        manager.save_snapshot({'junction_id': 2, 'statistics': {'total_vehicles': 1}})
+        time.sleep(0.5)
+        assert (Path(local_dir) / str(today) / 'junction_2' / 'data.jsonl').exists()
+        
+        # The exit hook flushes live managers without keeping them alive
+        manager.save_snapshot({'junction_id': 3, 'statistics': {'total_vehicles': 1}})
+        historical_data._flush_open_managers()
+        assert (Path(local_dir) / str(today) / 'junction_3' / 'data.jsonl').exists()
+        manager_ref = weakref.ref(manager)
+        del manager
+        gc.collect()
+        assert manager_ref() is None
+    finally:
+        shutil.rmtree(local_dir)
+
+def test_cached_analyses():
+    import shutil
+    import tempfile
+    
+    local_dir = tempfile.mkdtemp()
+    timestamp = datetime.now().replace(hour=9).isoformat()
+    try:
+        manager = HistoricalDataManager(local_dir=local_dir)
+        manager.save_snapshot({'timestamp': timestamp, 'junction_id': 0, 'statistics': {'total_vehicles': 10}})
+        
+        # Changing a returned result leaves the cached one intact
+        peaks = manager.get_peak_hours_history(7)
+        peaks[9]['average_vehicles'] = -1
+        peaks[0] = 'x'
+        assert manager.get_peak_hours_history(7) == {
+            9: {'average_vehicles': 10.0, 'peak_vehicles': 10, 'min_vehicles': 10, 'occurrences': 1}
+        }
+        
+        # Saving and clearing both invalidate cached results
+        manager.save_snapshot({'timestamp': timestamp, 'junction_id': 0, 'statistics': {'total_vehicles': 30}})
+        assert manager.get_peak_hours_history(7)[9]['average_vehicles'] == 20.0
+        assert manager.get_statistics_summary(7)['total_snapshots'] == 2
+        manager.clear_old_data(days_to_keep=-1)
+        assert manager.get_peak_hours_history(7) == {}
+        assert manager.get_statistics_summary(7) == {'status': 'No data available'}
+    finally:
+        shutil.rmtree(local_dir)
+
 if __name__ == "__main__":
     test_historical_data()
+    test_index_follows_disk()
+    test_stale_metrics_rebuilt()
+    test_buffered_saves()
+    test_cached_analyses()